@@ -0,0 +1,34 @@
+from flask import current_app, make_response
+from flask_restful.representations.json import output_json as default_output_json
+from http import HTTPStatus
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# JSON body of the resources, encoded by orjson when it is installed
+def dump_json(data) -> bytes:
+    """
+    RESTFUL_JSON settings are only understood by the json module, they keep the default encoder, as do
+    values orjson can not encode.
+    """
+    if orjson is not None and not current_app.config.get('RESTFUL_JSON'):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE
+        if current_app.debug:
+            option |= orjson.OPT_INDENT_2
+
+        try:
+            return orjson.dumps(data, option=option)
+        except TypeError:
+            pass
+
+    return default_output_json(data, HTTPStatus.OK).get_data()
+
+
+# JSON representation of the resources
+def output_json(data, code, headers=None):
+    resp = make_response(dump_json(data), code)
+    resp.headers.extend(headers or {})
+    return resp
@@ -2,7 +2,10 @@ from app import Blueprint, Api, api
 from .views.user_auth_api import UserRegisterAPI, UserAuthenticationAPI, LogoutAPI, PasswordChange, UserActivationAPI
 from .views.user_api import UserListAPI, UserAPI
 from .views.category_api import CategoryCreateListAPI, CategoryAPI
-from .views.book_api import BookCreateListAPI, BookAPI, BorrowBookAPI, ReturnBookAPI, BookReviewAPI, MyBookAPI, HistoryAPI
+from .views.book_api import BookCreateListAPI, BookImportAPI, BookAPI, BorrowBookAPI, ReturnBookAPI, BookReviewAPI, \
+    MyBookAPI, HistoryAPI, HistoryExportAPI
+from .views.cache_api import CacheStatsAPI
+from .representations import output_json
 
 # User auth Blueprint
 bp_user_auth = Blueprint('bp_user_auth', __name__, url_prefix='/api/user')
@@ -38,6 +41,7 @@ api_category.add_resource(CategoryAPI, '/<_id>', methods=['GET', 'PUT', 'DELETE'
 
 # Book urls
 api_book.add_resource(BookCreateListAPI, '', methods=['GET', 'POST'])
+api_book.add_resource(BookImportAPI, '/import', methods=['POST'])
 api_book.add_resource(BookAPI, '/<_id>', methods=['GET', 'PUT', 'DELETE'])
 api_book.add_resource(BorrowBookAPI, '/borrow/<_id>', methods=['GET'])
 api_book.add_resource(ReturnBookAPI, '/return/<_id>', methods=['GET'])
@@ -48,3 +52,11 @@ api.add_resource(MyBookAPI, '/my_books', methods=['GET'])
 
 # History
 api.add_resource(HistoryAPI, '/history', methods=['GET'])
+api.add_resource(HistoryExportAPI, '/history/export', methods=['GET'])
+
+# Cache stats
+api.add_resource(CacheStatsAPI, '/cache_stats', methods=['GET'])
+
+# JSON encoding of every API
+for resource_api in (api, api_user_auth, api_user, api_category, api_book):
+    resource_api.representations['application/json'] = output_json
@@ -0,0 +1,190 @@
+from flask import request, current_app
+from flask_jwt_extended import get_jwt_identity
+from flask_restful import abort
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+from app import response_cache
+from app.DB.models import User, Book, Category, History, BookReview
+from app.DB.routing import use_replica
+from app.DB.async_db import async_db, paginate, cursor_paginate
+from app.utils import auth_required, success_response
+from .book_api import BookCreateListAPI, BookAPI, HistoryAPI, book_list_filters, book_reviews_statement, \
+    book_categories_statement, history_filters, book_serializer, book_list_serializer, review_serializer, \
+    history_serializer
+from .category_api import CategoryCreateListAPI, category_list_entry, category_list_serializer
+from http import HTTPStatus
+
+
+# Async versions of the read heavy resources, served by app.asgi with the same auth, cache & serializers
+class AsyncBookListAPI:
+    """"
+    GET
+    """
+
+    @auth_required
+    @response_cache.cached(tags=('books', 'categories'))
+    @use_replica
+    async def get(self):
+        """
+        API for the book List, see BookCreateListAPI.get
+
+        :return: Book list data, ranked by relevance when searching
+        """
+        req_args = request.args.to_dict()
+        page_num = int(req_args.get("page_num", 1))
+        per_page = int(req_args.get("per_page", 10))
+        cursor = req_args.get('cursor')
+        with_total = req_args.get('total', '').lower() == 'true'
+        filters, matches = book_list_filters(req_args, get_jwt_identity())
+        statement = select(*book_list_serializer.columns).filter(*filters)
+
+        if matches is not None:
+            if cursor is not None:
+                abort(HTTPStatus.BAD_REQUEST,
+                      error="Cursor pagination is not supported for ranked search",
+                      status='BAD_REQUEST')
+            statement = statement.join(matches, matches.c.book_id == Book.id).order_by(matches.c.rank, Book.title)
+
+        async with async_db.session() as session:
+            if cursor is not None:
+                books, pages = await cursor_paginate(session, statement, ((Book.title, False), (Book.id, False)),
+                                                     cursor=cursor, per_page=per_page, with_total=with_total)
+            else:
+                if matches is None:
+                    statement = statement.order_by(Book.title)
+                books, pages = await paginate(session, statement, page_num, per_page)
+
+        data = book_list_serializer.dump(books)
+
+        return dict(code=HTTPStatus.OK,
+                    data=data,
+                    msg='Books retrieved successfully',
+                    status='OK',
+                    **pages)
+
+
+class AsyncBookAPI:
+    """"
+    GET
+    """
+
+    @auth_required
+    @response_cache.cached(tags=lambda _id: (f'book:{_id}', 'categories'),
+                           vary_on_user=lambda identity: identity['role'] == User.Public)
+    async def get(self, _id):
+        """
+        API for Book detailed, see BookAPI.get
+
+        :return: Book data
+        """
+        identity = get_jwt_identity()
+
+        async with async_db.session() as session:
+            book = await session.scalar(select(Book).options(joinedload(Book.added_by)).filter_by(id=_id))
+
+            if not book:
+                abort(HTTPStatus.NOT_FOUND, code=HTTPStatus.NOT_FOUND, error='Book not found', status='NOT_FOUND')
+
+            data = book_serializer.dump(book)
+
+            if identity['role'] == User.Public:
+                review_page = int(request.args.get("review_page", 1))
+                review_per_page = int(request.args.get("review_per_page", 10))
+
+                reviews = await session.execute(book_reviews_statement(_id, review_page, review_per_page))
+
+                data['reviews'] = [dict(review_serializer.dump(review), user_name=user_name)
+                                   for review, user_name in reviews]
+                data['reviews_next'] = review_page + 1 if review_page * review_per_page < book.total_review else None
+
+                history = await session.scalar(select(History.id).filter_by(user_id=identity['id'], book_id=_id)
+                                                                 .limit(1))
+                if history is not None:
+                    data['can_review'] = True
+
+                    my_review = await session.scalar(select(BookReview).filter_by(user_id=identity['id'], book_id=_id)
+                                                                       .limit(1))
+                    data['my_review'] = review_serializer.dump(my_review) if my_review else {}
+                else:
+                    data['can_review'] = False
+
+            data['added_by'] = str(book.added_by)
+            data['category'] = (await session.execute(book_categories_statement(_id))).scalars().all()
+
+        return success_response(code=HTTPStatus.OK,
+                                data=data,
+                                msg='Book retrieved successfully',
+                                status='OK')
+
+
+# Serialized category list, built through the async session on a miss
+async def build_category_list(version) -> dict:
+    async with async_db.session() as session:
+        categories = (await session.execute(select(*category_list_serializer.columns)
+                                            .order_by(Category.name))).all()
+
+    return category_list_entry(categories, version)
+
+
+class AsyncCategoryListAPI:
+    """"
+    GET
+    """
+
+    @auth_required
+    async def get(self):
+        """
+        API for the Category List, see CategoryCreateListAPI.get
+
+        :return: Category list data
+        """
+        category_list = await current_app.extensions['category_list_cache'].get_async(build_category_list)
+        response = current_app.response_class(category_list['body'], mimetype='application/json')
+        response.set_etag(category_list['etag'])
+        response.last_modified = category_list['last_modified']
+
+        return response.make_conditional(request)
+
+
+class AsyncHistoryAPI:
+    """"
+    GET
+    """
+
+    @auth_required
+    @use_replica
+    async def get(self):
+        """
+        API for book history, see HistoryAPI.get
+
+        :return: JSON book history data
+        """
+        req_args = request.args.to_dict()
+        page_num = int(req_args.get("page_num", 1))
+        per_page = int(req_args.get("per_page", 10))
+        cursor = req_args.get('cursor')
+        with_total = req_args.get('total', '').lower() == 'true'
+        statement = select(*history_serializer.columns).filter(*history_filters(req_args, get_jwt_identity()))
+
+        async with async_db.session() as session:
+            if cursor is not None:
+                history, pages = await cursor_paginate(session, statement, ((History.date, True), (History.id, True)),
+                                                       cursor=cursor, per_page=per_page, with_total=with_total)
+            else:
+                history, pages = await paginate(session, statement.order_by(History.date.desc()), page_num, per_page)
+
+        data = history_serializer.dump(history)
+        return dict(code=HTTPStatus.OK,
+                    data=data,
+                    msg='Data retrieved successfully',
+                    status='OK',
+                    **pages)
+
+
+# Async resource serving the GETs of each sync resource
+async_resources = {
+    BookCreateListAPI: AsyncBookListAPI,
+    BookAPI: AsyncBookAPI,
+    CategoryCreateListAPI: AsyncCategoryListAPI,
+    HistoryAPI: AsyncHistoryAPI,
+}
@@ -1,12 +1,63 @@
-from flask import request, abort
+from flask import request, current_app, Response, stream_with_context
 from flask_jwt_extended import get_jwt_identity
-from flask_restful import Resource
-from app.DB.models import User, Book, Category, History, BookReview, db
-from app.DB.serializers import BookSerializer, BookReviewSerializer, HistorySerializer
-from app.utils import auth_required, librarian_access, book_summit, success_response, can_review
+from flask_restful import Resource, abort
+from app import response_cache
+from sqlalchemy.exc import IntegrityError
+from app.DB.models import User, Book, Category, History, BookReview, Loan, category_book, db
+from app.DB.search import book_search
+from app.DB.routing import use_replica
+from app.DB.book_import import import_books, CSV, NDJSON
+from app.DB.serializers import BookSerializer, BookReviewSerializer, HistorySerializer, compiled_serializer
+from app.utils import auth_required, admin_access, librarian_access, book_summit, success_response, can_review, cursor_paginate, \
+    load_current_user
 from http import HTTPStatus
-import json
+import csv
 import datetime
+import io
+import json
+import zlib
+
+# Serializers shared by every request
+book_serializer = compiled_serializer(BookSerializer)
+book_list_serializer = compiled_serializer(BookSerializer, many=True,
+                                          only=('id', 'title', 'author', 'short_description', 'count',
+                                                'overall_rating', 'total_review'))
+my_book_serializer = compiled_serializer(BookSerializer, only=('id', 'title'))
+review_serializer = compiled_serializer(BookReviewSerializer)
+history_serializer = compiled_serializer(HistorySerializer, many=True,
+                                         only=('id', 'book_title', 'date', 'type', 'user_name'))
+
+
+# Book list filters & the full-text matches from the query args, shared by the sync & async book list
+def book_list_filters(args: dict, identity: dict) -> tuple:
+    filters = [Book.count.isnot(0) if identity['role'] == User.Public else Book.id.isnot(None)]
+
+    if 'title' in args:
+        filters.append(Book.title.contains(args['title']))
+    if 'author' in args:
+        filters.append(Book.author.contains(args['author']))
+    if 'overall_rating' in args:
+        filters.append(Book.overall_rating >= args['overall_rating'])
+    if 'category' in args:
+        filters.append(db.exists().where(category_book.c.book_id == Book.id,
+                                         category_book.c.category_id.in_(args['category'].split(','))))
+
+    return filters, book_search.search(q=args.get('q'))
+
+# Page of the reviews of a book with their authors' names, newest first
+def book_reviews_statement(_id: str, review_page: int, review_per_page: int):
+    return db.select(BookReview, User.full_name) \
+             .outerjoin(User, User.id == BookReview.user_id) \
+             .filter(BookReview.book_id == _id) \
+             .order_by(BookReview.create_at.desc()) \
+             .limit(review_per_page).offset((review_page - 1) * review_per_page)
+
+# Category names of a book
+def book_categories_statement(_id: str):
+    return db.select(Category.name) \
+             .join(category_book, category_book.c.category_id == Category.id) \
+             .filter(category_book.c.book_id == _id) \
+             .order_by(Category.name)
 
 
 class BookCreateListAPI(Resource):
@@ -24,8 +75,7 @@ class BookCreateListAPI(Resource):
         :return: Success or error message
         """
         request_data = request.json
-        identity = get_jwt_identity()
-        current_user = User.get_by_id(identity['id'])
+        current_user = load_current_user()
 
         try:
             title = request_data.get('title').strip().lower()
@@ -49,49 +99,92 @@ class BookCreateListAPI(Resource):
                   status='BAD_REQUEST')
 
     @auth_required
+    @response_cache.cached(tags=('books', 'categories'))
+    @use_replica
     def get(self):
         """
         API for the book List
 
-        :return: Book list data
+        Optional args: q (full-text search over title, author & descriptions), title & author (substring matches),
+                       category, overall_rating, page_num, per_page,
+                       cursor (keyset pagination, empty for the first page), total (true to count in cursor mode)
+        :return: Book list data, ranked by relevance when searching
         """
         req_args = request.args.to_dict()
         page_num = int(req_args.get("page_num", 1))
         per_page = int(req_args.get("per_page", 10))
-        req_args.pop('page_num', None)
-        req_args.pop('per_page', None)
-        filters = [Book.count.isnot(0)]
+        cursor = req_args.get('cursor')
+        with_total = req_args.get('total', '').lower() == 'true'
+        filters, matches = book_list_filters(req_args, get_jwt_identity())
+        books_query = Book.query.with_entities(*book_list_serializer.columns).filter(*filters)
+
+        if matches is not None:
+            if cursor is not None:
+                abort(HTTPStatus.BAD_REQUEST,
+                      error="Cursor pagination is not supported for ranked search",
+                      status='BAD_REQUEST')
+            books_query = books_query.join(matches, matches.c.book_id == Book.id).order_by(matches.c.rank,
+                                                                                            Book.title)
+
+        if cursor is not None:
+            books, pages = cursor_paginate(books_query, ((Book.title, False), (Book.id, False)),
+                                           cursor=cursor, per_page=per_page, with_total=with_total)
+        else:
+            if matches is None:
+                books_query = books_query.order_by(Book.title)
+            page = books_query.paginate(page=page_num, per_page=per_page, error_out=False)
+            books, pages = page.items, dict(previous=page.prev_num, next=page.next_num, total=page.total)
+
+        data = book_list_serializer.dump(books)
 
-        identity = get_jwt_identity()
-        if identity['role'] != User.Public:
-            filters[0] = Book.id.isnot(None)
+        return dict(code=HTTPStatus.OK,
+                    data=data,
+                    msg='Books retrieved successfully',
+                    status='OK',
+                    **pages)
 
-        filter_mapper = {"title": Book.title.contains(req_args.get("title", "")),
-                         "author": Book.author.contains(req_args.get("author", "")),
-                         "overall_rating": Book.overall_rating >= req_args.get("overall_rating", 0)}
 
-        if 'category' in req_args:
-            categories = Category.query.filter(Category.id.in_(req_args.get("category", ).split(','))).all()
-            book_ids = set()
-            for category in categories:
-                book_ids.update([i.id for i in category.books])
-            filter_mapper['category'] = Book.id.in_(book_ids)
+class BookImportAPI(Resource):
+    """"
+    POST
+    """
 
-        for req_arg in req_args:
-            filters[0] = filters[0] & filter_mapper.get(req_arg)
+    @admin_access
+    def post(self):
+        """
+        API for importing books in bulk
 
-        books = Book.query.filter(*filters).order_by(Book.title).paginate(page=page_num, per_page=per_page,
-                                                                          error_out=False)
-        serializer = BookSerializer(many=True, only=('id', 'title', 'author', 'short_description', 'count', 'overall_rating', 'total_review'))
-        data = serializer.dump(books.items)
+        Body: CSV with a header line (title, author, short_description, full_description, count & categories
+              separated by |) or JSON lines with the same keys & categories as a list, raw or as a `file` upload
+        Optional args: format (csv or ndjson, by default from the content type or file name), batch_size,
+                       create_categories (true to create the categories which do not exist yet)
+        :return: Imported & failed counts with the error of each rejected line
+        """
+        upload = request.files.get('file')
+        stream = upload.stream if upload else request.stream
+        content_type = (upload.content_type if upload else request.content_type) or ''
+        file_name = upload.filename if upload else ''
+        fmt = request.args.get('format') or (CSV if 'csv' in content_type or file_name.endswith('.csv') else NDJSON)
 
-        return dict(code=HTTPStatus.OK,
-                    data=data,
-                    msg='Books retrieved successfully',
-                    status='OK',
-                    previous=books.prev_num,
-                    next=books.next_num,
-                    total=books.total)
+        if fmt not in (CSV, NDJSON):
+            abort(HTTPStatus.BAD_REQUEST,
+                  error="format must be csv or ndjson",
+                  status='BAD_REQUEST')
+
+        try:
+            report = import_books(io.TextIOWrapper(stream, encoding='utf-8', newline=''), fmt,
+                                  user_id=get_jwt_identity()['id'],
+                                  batch_size=int(request.args.get('batch_size', 1000)),
+                                  create_categories=request.args.get('create_categories', '').lower() == 'true')
+        except UnicodeDecodeError:
+            abort(HTTPStatus.BAD_REQUEST,
+                  error="The file must be UTF-8 encoded",
+                  status='BAD_REQUEST')
+
+        return success_response(code=HTTPStatus.OK,
+                                data=report,
+                                msg=f"{report['imported']} books imported, {report['failed']} rejected",
+                                status='OK')
 
 
 class BookAPI(Resource):
@@ -100,44 +193,40 @@ class BookAPI(Resource):
     """
 
     @auth_required
+    @response_cache.cached(tags=lambda _id: (f'book:{_id}', 'categories'),
+                           vary_on_user=lambda identity: identity['role'] == User.Public)
     def get(self, _id):
         """
         API for Book detailed
 
         Required data: book id in URL
+        Optional args: review_page, review_per_page
         :return: Book data
         """
-        book = Book.get_by_id(_id)
+        book = Book.get_by_id(_id, db.joinedload(Book.added_by))
         identity = get_jwt_identity()
-        serializer = BookSerializer()
-        data = serializer.dump(book)
+        data = book_serializer.dump(book)
 
         if identity['role'] == User.Public:
-            current_user = User.get_by_id(identity['id'])
-            reviews = []
-            reviews_append = reviews.append
-            review_serializer = BookReviewSerializer()
+            review_page = int(request.args.get("review_page", 1))
+            review_per_page = int(request.args.get("review_per_page", 10))
 
-            for review in book.review:
-                review_data = review_serializer.dump(review)
-                review_data['user_name'] = review.user.full_name
-                reviews_append(review_data)
+            reviews = db.session.execute(book_reviews_statement(_id, review_page, review_per_page)).all()
 
-            data['reviews'] = sorted(reviews, key=lambda x: x['create_at'], reverse=True)
+            data['reviews'] = [dict(review_serializer.dump(review), user_name=user_name)
+                               for review, user_name in reviews]
+            data['reviews_next'] = review_page + 1 if review_page * review_per_page < book.total_review else None
 
             if can_review(user_id=identity['id'], book_id=_id):
                 data['can_review'] = True
 
-                review_book_ids = current_user.review_book_ids()
-                if _id in review_book_ids:
-                    data['my_review'] = review_serializer.dump(review_book_ids.get(_id))
-                else:
-                    data['my_review'] = {}
+                my_review = BookReview.query.filter_by(user_id=identity['id'], book_id=_id).first()
+                data['my_review'] = review_serializer.dump(my_review) if my_review else {}
             else:
                 data['can_review'] = False
 
         data['added_by'] = str(book.added_by)
-        data['category'] = str(book.category).replace('[', '').replace(']', '').split(', ')
+        data['category'] = db.session.execute(book_categories_statement(_id)).scalars().all()
 
         return success_response(code=HTTPStatus.OK,
                                 data=data,
@@ -153,13 +242,12 @@ class BookAPI(Resource):
         :return: Success or Error response
         """
         request_data = request.json
-        identity = get_jwt_identity()
-        current_user = User.get_by_id(identity['id'])
+        current_user = load_current_user()
 
         book = Book.get_by_id(_id)
 
-        category_id = request_data.get('category_id', book.category)
-        if category_id != str(book.category).replace('[', '').replace(']', '').split(', '):
+        category_id = request_data.get('category_id')
+        if category_id is not None:
             book.category = Category.query.filter(Category.id.in_(category_id)).all()
 
         book.title = request_data.get('title', book.title).strip().lower()
@@ -185,6 +273,7 @@ class BookAPI(Resource):
         book = Book.get_by_id(_id)
         db.session.delete(book)
         db.session.commit()
+        response_cache.invalidate('books', f'book:{_id}')
 
         return success_response(code=HTTPStatus.OK,
                                 msg='Book deleted successfully',
@@ -204,29 +293,39 @@ class BorrowBookAPI(Resource):
         :param _id: Book ID
         :return: Success or Error response
         """
-        identity = get_jwt_identity()
-        current_user = User.get_by_id(identity['id'])
+        current_user = load_current_user()
         book = Book.get_by_id(_id)
-        book_borrowed = json.loads(current_user.book_borrowed)
 
-        if _id in book_borrowed:
+        if Loan.get_active(user_id=current_user.id, book_id=_id):
             abort(HTTPStatus.CONFLICT,
                   error='Book already borrowed',
                   status='CONFLICT')
 
-        if not book.count:
+        if not Book.take_copy(_id):
+            db.session.rollback()
             abort(HTTPStatus.CONFLICT,
                   error='All copies Borrowed out',
                   status='CONFLICT')
 
-        book_borrowed.append(_id)
-        book.count -= 1
-        current_user.book_borrowed = json.dumps(book_borrowed)
+        borrowed_at = datetime.datetime.utcnow()
+        loan = Loan(user_id=current_user.id, book_id=book.id, borrowed_at=borrowed_at,
+                    due_at=borrowed_at + current_app.config['LOAN_PERIOD'])
+        db.session.add(loan)
         record = History(user_id=current_user.id, book_id=book.id,
                          book_title=book.title, user_name=current_user.username,
                          type=History.borrow_book)
         db.session.add(record)
-        db.session.commit()
+
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # A concurrent request opened the same loan, the copy taken above is rolled back too
+            db.session.rollback()
+            abort(HTTPStatus.CONFLICT,
+                  error='Book already borrowed',
+                  status='CONFLICT')
+
+        response_cache.invalidate('books', f'book:{_id}')
 
         return success_response(code=HTTPStatus.OK,
                                 msg='Book borrowed successfully',
@@ -246,25 +345,24 @@ class ReturnBookAPI(Resource):
         :param _id: Book ID
         :return: Success or Error response
         """
-        identity = get_jwt_identity()
-        current_user = User.get_by_id(identity['id'])
+        current_user = load_current_user()
         book = Book.get_by_id(_id)
-        book_borrowed = json.loads(current_user.book_borrowed)
+        loan = Loan.get_active(user_id=current_user.id, book_id=_id)
 
-        if _id not in book_borrowed:
+        if not loan or not Loan.close(loan.id, returned_at=datetime.datetime.utcnow()):
+            db.session.rollback()
             abort(HTTPStatus.FORBIDDEN,
                   error="Book not borrowed yet",
                   status='CONFLICT')
 
-        book.count += 1
-        book_borrowed.remove(_id)
-        current_user.book_borrowed = json.dumps(book_borrowed)
+        Book.put_back_copy(_id)
 
         record = History(user_id=current_user.id, book_id=book.id,
                          book_title=book.title, user_name=current_user.username,
                          type=History.return_book)
         db.session.add(record)
         db.session.commit()
+        response_cache.invalidate('books', f'book:{_id}')
 
         return success_response(code=HTTPStatus.OK,
                                 msg='Book returned successfully',
@@ -287,24 +385,23 @@ class MyBookAPI(Resource):
         page_num = int(req_args.get("page_num", 1))
         per_page = int(req_args.get("per_page", 10))
         identity = get_jwt_identity()
-        current_user = User.get_by_id(identity['id'])
-        print(current_user.book_borrowed)
-        books_query = Book.query.filter(Book.id.in_(json.loads(current_user.book_borrowed))).paginate(page=page_num,
-                                                                                                      per_page=per_page,
-                                                                                                      error_out=False)
+        current_user_id = identity['id']
+
+        # Borrowed books of the page with the user's own review of each, in a single query
+        books_query = db.session.query(Book.id, Book.title, BookReview) \
+                                .join(Loan, Loan.book_id == Book.id) \
+                                .outerjoin(BookReview, (BookReview.book_id == Book.id) &
+                                           (BookReview.user_id == current_user_id)) \
+                                .filter(Loan.user_id == current_user_id, Loan.returned_at.is_(None)) \
+                                .order_by(Loan.borrowed_at.desc()).paginate(page=page_num,
+                                                                            per_page=per_page,
+                                                                            error_out=False)
         data = []
         data_append = data.append
-        book_serializer = BookSerializer(only=('id', 'title'))
 
         for book in books_query.items:
-            serialized_data = book_serializer.dump(book)
-            review_book_ids = current_user.review_book_ids()
-            if book.id in review_book_ids:
-                review_serializer = BookReviewSerializer()
-                serialized_data['my_review'] = review_serializer.dump(review_book_ids.get(book.id))
-            else:
-                serialized_data['my_review'] = {}
-
+            serialized_data = my_book_serializer.dump(book)
+            serialized_data['my_review'] = review_serializer.dump(book.BookReview) if book.BookReview else {}
             data_append(serialized_data)
 
         return dict(code=HTTPStatus.OK,
@@ -316,55 +413,145 @@ class MyBookAPI(Resource):
                     total=books_query.total)
 
 
+# History filters from the query args, shared by the history list & export
+def history_filters(args: dict, identity: dict) -> list:
+    filters = []
+
+    if identity['role'] == User.Public:
+        filters.append(History.user_id == identity['id'])
+    if 'book_title' in args:
+        filters.append(History.book_title.contains(args['book_title']))
+    if 'user_name' in args:
+        filters.append(History.user_name.contains(args['user_name']))
+    if 'type' in args:
+        filters.append(History.type.in_(args['type'].split(',')))
+    if 'date' in args:
+        date = args['date'].split(',')
+        filters.append(History.date.between(f'{date[0][:10]} 00:00:00', f'{date[-1][:10]} 23:59:59'))
+
+    return filters
+
+
 class HistoryAPI(Resource):
     """"
     GET
     """
 
     @auth_required
+    @use_replica
     def get(self):
         """
         API for book history
 
+        Optional args: book_title, user_name, type, date, page_num, per_page,
+                       cursor (keyset pagination, empty for the first page), total (true to count in cursor mode)
         :return: JSON book history data
         """
         req_args = request.args.to_dict()
         page_num = int(req_args.get("page_num", 1))
         per_page = int(req_args.get("per_page", 10))
-        req_args.pop('page_num', None)
-        req_args.pop('per_page', None)
-        identity = get_jwt_identity()
-        current_user_id = identity['id']
-        attr = {'id', 'book_title', 'date', 'type', 'user_name'}
-        filters = [History.id.isnot(None)]
+        cursor = req_args.get('cursor')
+        with_total = req_args.get('total', '').lower() == 'true'
+        history_query = History.query.with_entities(*history_serializer.columns) \
+                                     .filter(*history_filters(req_args, get_jwt_identity()))
+
+        if cursor is not None:
+            history, pages = cursor_paginate(history_query, ((History.date, True), (History.id, True)),
+                                             cursor=cursor, per_page=per_page, with_total=with_total)
+        else:
+            page = history_query.order_by(History.date.desc()).paginate(page=page_num,
+                                                                        per_page=per_page,
+                                                                        error_out=False)
+            history, pages = page.items, dict(previous=page.prev_num, next=page.next_num, total=page.total)
+
+        data = history_serializer.dump(history)
+        return dict(code=HTTPStatus.OK,
+                    data=data,
+                    msg='Data retrieved successfully',
+                    status='OK',
+                    **pages)
 
-        filter_mapper = {"book_title": History.book_title.contains(req_args.get("book_title", "")),
-                         "user_name": History.user_name.contains(req_args.get("user_name", "")),
-                         "type": History.type.in_(req_args.get("type", "").split(","))}
 
-        if 'date' in req_args:
-            date = req_args.get("date").split(',')
-            filter_mapper["date"] = History.date.between(f'{date[0][:10]} 00:00:00', f'{date[1][:10]} 23:59:59')
+class HistoryExportAPI(Resource):
+    """"
+    GET
+    """
+    columns = (History.id, History.date, History.type, History.user_id, History.user_name, History.book_id,
+               History.book_title)
+    # Rows fetched per round trip & bytes buffered before a chunk is sent
+    fetch_size = 1000
+    chunk_size = 64 * 1024
 
-        if identity['role'] == User.Public:
-            filters[0] = History.user_id == current_user_id
+    @auth_required
+    @use_replica
+    def get(self):
+        """
+        API for exporting the book history as a stream, oldest first
 
-        for req_arg in req_args:
-            filters[0] = filters[0] & filter_mapper.get(req_arg)
+        Optional args: book_title, user_name, type, date (same filters as the history list),
+                       format (csv or ndjson, default csv), gzip (true to compress)
+        :return: CSV or JSON lines download
+        """
+        fmt = request.args.get('format', 'csv')
+        compress = request.args.get('gzip', '').lower() == 'true'
 
-        history = History.query.filter(*filters).order_by(History.date.desc()).paginate(page=page_num,
-                                                                                        per_page=per_page,
-                                                                                        error_out=False)
+        if fmt not in ('csv', 'ndjson'):
+            abort(HTTPStatus.BAD_REQUEST,
+                  error="format must be csv or ndjson",
+                  status='BAD_REQUEST')
 
-        serializer = HistorySerializer(many=True, only=attr)
-        data = serializer.dump(history.items)
-        return dict(code=HTTPStatus.OK,
-                    data=data,
-                    msg='Data retrieved successfully',
-                    status='OK',
-                    previous=history.prev_num,
-                    next=history.next_num,
-                    total=history.total)
+        query = db.session.query(*self.columns).filter(*history_filters(request.args, get_jwt_identity())) \
+                          .order_by(History.date, History.id).yield_per(self.fetch_size)
+        chunks = self.csv_chunks(query) if fmt == 'csv' else self.ndjson_chunks(query)
+        if compress:
+            chunks = self.gzip_chunks(chunks)
+
+        file_name = f"history.{fmt}{'.gz' if compress else ''}"
+        mimetype = 'application/gzip' if compress else 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+        return Response(stream_with_context(chunks), mimetype=mimetype,
+                        headers={'Content-Disposition': f'attachment; filename={file_name}'})
+
+    @staticmethod
+    def values(row) -> tuple:
+        return (row.id, row.date.isoformat() if row.date else None, *row[2:])
+
+    def csv_chunks(self, rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow([column.key for column in self.columns])
+
+        for row in rows:
+            writer.writerow(self.values(row))
+            if buffer.tell() >= self.chunk_size:
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+
+        yield buffer.getvalue().encode()
+
+    def ndjson_chunks(self, rows):
+        keys = [column.key for column in self.columns]
+        lines, size = [], 0
+
+        for row in rows:
+            line = json.dumps(dict(zip(keys, self.values(row)))) + '\n'
+            lines.append(line)
+            size += len(line)
+            if size >= self.chunk_size:
+                yield ''.join(lines).encode()
+                lines, size = [], 0
+
+        yield ''.join(lines).encode()
+
+    @staticmethod
+    def gzip_chunks(chunks):
+        compressor = zlib.compressobj(wbits=31)
+        for chunk in chunks:
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+
+        yield compressor.flush()
 
 
 class BookReviewAPI(Resource):
@@ -381,9 +568,8 @@ class BookReviewAPI(Resource):
         :JSON : rating, review(optional)
         :return: Success or Error response
         """
-        identity = get_jwt_identity()
-        current_user_id = identity['id']
-        current_user = User.get_by_id(current_user_id)
+        current_user = load_current_user()
+        current_user_id = current_user.id
         book = Book.get_by_id(_id)
 
         if not can_review(user_id=current_user_id, book_id=_id):
@@ -407,6 +593,7 @@ class BookReviewAPI(Resource):
         book.overall_rating = round(book.total_rating / book.total_review, 1)
         db.session.add(book_review)
         db.session.commit()
+        response_cache.invalidate('books', f'book:{_id}')
 
         return success_response(code=HTTPStatus.OK,
                                 msg='Review successfully',
@@ -435,6 +622,7 @@ class BookReviewAPI(Resource):
         book_review.review = review
 
         db.session.commit()
+        response_cache.invalidate('books', f'book:{book.id}')
 
         return success_response(code=HTTPStatus.OK,
                                 msg='Review updated successfully',
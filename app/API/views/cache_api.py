@@ -0,0 +1,22 @@
+from flask_restful import Resource
+from app import response_cache
+from app.utils import admin_access, success_response
+from http import HTTPStatus
+
+
+class CacheStatsAPI(Resource):
+    """"
+    GET
+    """
+
+    @admin_access
+    def get(self):
+        """
+        API for the response cache counters of this process
+
+        :return: hits, misses, evictions & size
+        """
+        return success_response(code=HTTPStatus.OK,
+                                data=response_cache.stats(),
+                                msg='Cache stats retrieved successfully',
+                                status='OK')
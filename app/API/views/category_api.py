@@ -1,11 +1,38 @@
-from flask import request, abort
-from flask_jwt_extended import get_jwt_identity
-from flask_restful import Resource
+from flask import request, current_app
+from flask_restful import Resource, abort
+from app import response_cache
+from app.API.representations import dump_json
 from app.DB.models import User, Category, db
-from app.DB.serializers import CategorySerializer
-from app.utils import auth_required, librarian_access, category_summit, success_response
+from app.DB.serializers import CategorySerializer, compiled_serializer
+from app.utils import auth_required, librarian_access, category_summit, success_response, load_current_user
 from http import HTTPStatus
 import datetime
+import hashlib
+
+# Category fields of the category list
+category_list_serializer = compiled_serializer(CategorySerializer, only=('id', 'name'), many=True)
+
+
+# Serialized category list with its validators, rebuilt only when a category is written
+def build_category_list(version) -> dict:
+    categories = Category.query.with_entities(*category_list_serializer.columns).order_by(Category.name).all()
+    return category_list_entry(categories, version)
+
+# Cache entry of the category list, shared by the sync & async category list
+def category_list_entry(categories: list, version) -> dict:
+    data = category_list_serializer.dump(categories)
+    body = dump_json(success_response(code=HTTPStatus.OK,
+                                      data=data,
+                                      msg='Category list retrieved successfully',
+                                      status='OK'))
+
+    return dict(body=body,
+                etag=hashlib.sha1(body).hexdigest(),
+                last_modified=current_app.extensions['category_list_cache'].version.modified_at(version))
+
+# Dropping the cached category list in every process
+def invalidate_category_list() -> None:
+    current_app.extensions['category_list_cache'].invalidate()
 
 
 class CategoryCreateListAPI(Resource):
@@ -23,8 +50,7 @@ class CategoryCreateListAPI(Resource):
         """
         request_data = request.json
         name = request_data.get('name')
-        identity = get_jwt_identity()
-        current_user = User.get_by_id(identity['id'])
+        current_user = load_current_user()
 
         if not name:
             abort(HTTPStatus.BAD_REQUEST,
@@ -32,26 +58,27 @@ class CategoryCreateListAPI(Resource):
                   status='BAD_REQUEST')
 
         category = Category(name=name.strip().lower(), added_by=current_user)
+        response = category_summit(code=HTTPStatus.CREATED,
+                                   data=category,
+                                   msg='Category added successfully')
+        invalidate_category_list()
 
-        return category_summit(code=HTTPStatus.CREATED,
-                               data=category,
-                               msg='Category added successfully')
+        return response
 
     @auth_required
     def get(self):
         """
         API for the Category List
 
+        Supports If-None-Match & If-Modified-Since, answered with 304 from the cache
         :return: Category list data
         """
-        categories = Category.query.order_by(Category.name).all()
-        serializer = CategorySerializer(many=True, only=('id', 'name'))
-        data = serializer.dump(categories)
+        category_list = current_app.extensions['category_list_cache'].get(build_category_list)
+        response = current_app.response_class(category_list['body'], mimetype='application/json')
+        response.set_etag(category_list['etag'])
+        response.last_modified = category_list['last_modified']
 
-        return success_response(code=HTTPStatus.OK,
-                                data=data,
-                                msg='Category list retrieved successfully',
-                                status='OK')
+        return response.make_conditional(request)
 
 
 class CategoryAPI(Resource):
@@ -60,6 +87,7 @@ class CategoryAPI(Resource):
     """
 
     @librarian_access
+    @response_cache.cached(tags=lambda _id: (f'category:{_id}',))
     def get(self, _id):
         """
         API for Category detailed
@@ -86,17 +114,18 @@ class CategoryAPI(Resource):
         :return: Success or Error response
         """
         request_data = request.json
-        identity = get_jwt_identity()
-        current_user = User.get_by_id(identity['id'])
+        current_user = load_current_user()
         category = Category.get_by_id(_id)
         name = request_data.get('name', category.name)
         category.name = name.strip().lower()
         category.updated_by = repr(current_user)
         category.updated_at = datetime.datetime.utcnow()
+        response = category_summit(code=HTTPStatus.OK,
+                                   data=category,
+                                   msg='Category updated successfully')
+        invalidate_category_list()
 
-        return category_summit(code=HTTPStatus.OK,
-                               data=category,
-                               msg='Category updated successfully')
+        return response
 
     @librarian_access
     def delete(self, _id):
@@ -109,6 +138,8 @@ class CategoryAPI(Resource):
         category = Category.get_by_id(_id)
         db.session.delete(category)
         db.session.commit()
+        invalidate_category_list()
+        response_cache.invalidate('categories', f'category:{_id}')
 
         return success_response(code=HTTPStatus.OK,
                                 msg='Category deleted successfully',
@@ -1,12 +1,19 @@
-from flask import request, abort
+from flask import request
 from flask_jwt_extended import get_jwt_identity
-from flask_restful import Resource
+from flask_restful import Resource, abort
+from app import revocation_cache, token_versions
 from app.DB.models import User, UserCurrentJWTToken, TokenBlocklist, db
-from app.DB.serializers import UserSerializer
-from app.utils import auth_required, librarian_access, user_summit, success_response
+from app.DB.serializers import UserSerializer, compiled_serializer
+from app.DB.routing import use_replica
+from app.utils import auth_required, librarian_access, user_summit, success_response, cursor_paginate, \
+    load_current_user, get_user
 from http import HTTPStatus
 import datetime
 
+# User fields of the user list
+user_list_serializer = compiled_serializer(UserSerializer, only=('id', 'full_name', 'username', 'email', 'is_active',
+                                                                 'user_type'), many=True)
+
 
 class UserListAPI(Resource):
     """"
@@ -14,10 +21,13 @@ class UserListAPI(Resource):
     """
 
     @librarian_access
+    @use_replica
     def get(self):
         """
         API for list tha all users
 
+        Optional args: user_type, email, username, full_name, is_active, page_num, per_page,
+                       cursor (keyset pagination, empty for the first page), total (true to count in cursor mode)
         :return: Users data
         """
         req_args = request.args.to_dict()
@@ -26,6 +36,8 @@ class UserListAPI(Resource):
         identity = get_jwt_identity()
         req_args.pop('page_num', None)
         req_args.pop('per_page', None)
+        cursor = req_args.pop('cursor', None)
+        with_total = req_args.pop('total', '').lower() == 'true'
         filters = [User.id.isnot(None)]
 
         filter_mapper = {"user_type": User.user_type.in_(req_args.get("user_type", "").split(",")),
@@ -41,21 +53,24 @@ class UserListAPI(Resource):
         for req_arg in req_args:
             filters[0] = filters[0] & filter_mapper.get(req_arg)
 
-        users = User.query.filter(*filters).order_by(User.username).paginate(page=page_num,
-                                                                             per_page=per_page,
-                                                                             error_out=False)
+        users_query = User.query.with_entities(*user_list_serializer.columns).filter(*filters)
+
+        if cursor is not None:
+            users, pages = cursor_paginate(users_query, ((User.username, False), (User.id, False)),
+                                           cursor=cursor, per_page=per_page, with_total=with_total)
+        else:
+            page = users_query.order_by(User.username).paginate(page=page_num,
+                                                                per_page=per_page,
+                                                                error_out=False)
+            users, pages = page.items, dict(previous=page.prev_num, next=page.next_num, total=page.total)
 
-        serializer = UserSerializer(only=('id', 'full_name', 'username', 'email', 'is_active', 'user_type'),
-                                    many=True)
-        data = serializer.dump(users.items)
+        data = user_list_serializer.dump(users)
 
         return dict(code=HTTPStatus.OK,
                     data=data,
                     msg='Successfully retrieved users',
                     status='OK',
-                    previous=users.prev_num,
-                    next=users.next_num,
-                    total=users.total)
+                    **pages)
 
 
 class UserAPI(Resource):
@@ -71,9 +86,8 @@ class UserAPI(Resource):
         :param :  User ID
         :return: User data
         """
-        user = User.get_by_id(_id)
-        identity = get_jwt_identity()
-        current_user = User.get_by_id(identity['id'])
+        current_user = load_current_user()
+        user = get_user(_id)
         current_user_type = current_user.user_type
 
         if not ((current_user_type == User.Librarian and user.user_type == User.Public) or
@@ -101,9 +115,8 @@ class UserAPI(Resource):
         :return: Success or error response
         """
         request_data = request.json
-        user = User.get_by_id(_id)
-        identity = get_jwt_identity()
-        current_user = User.get_by_id(identity['id'])
+        current_user = load_current_user()
+        user = get_user(_id)
         current_user_type = current_user.user_type
 
         if not ((current_user_type == User.Librarian and user.user_type == User.Public) or
@@ -114,6 +127,8 @@ class UserAPI(Resource):
                   error="You don't have the permission to access this",
                   status='FORBIDDEN')
 
+        role, is_active = user.user_type, user.is_active
+
         if current_user_type == User.Admin:
             user.user_type = request_data.get('user_type', current_user_type)
             user.email = request_data.get('email', user.email).lower().strip()
@@ -130,8 +145,14 @@ class UserAPI(Resource):
         user.phone = request_data.get('phone', user.phone).lower().strip()
         user.updated_by = repr(current_user)
         user.updated_at = datetime.datetime.utcnow()
+        revoke = user.user_type != role or (bool(is_active) and not user.is_active)
+        if revoke:
+            user.revoke_tokens()
         db.session.commit()
 
+        if revoke:
+            token_versions.invalidate()
+
         return user_summit(code=HTTPStatus.OK,
                            data=user,
                            msg='User data updated successfully')
@@ -144,9 +165,8 @@ class UserAPI(Resource):
         :param :  User ID
         :return: Success or error response
         """
-        user = User.get_by_id(_id)
-        identity = get_jwt_identity()
-        current_user = User.get_by_id(identity['id'])
+        current_user = load_current_user()
+        user = get_user(_id)
 
         if not ((
                         current_user.user_type == User.Librarian and user.user_type == User.Public) or current_user.user_type == User.Admin):
@@ -155,16 +175,20 @@ class UserAPI(Resource):
                   status='FORBIDDEN')
 
         jti = UserCurrentJWTToken.query.filter_by(user_id=user.id).first()
+        revoked_jti = jti.jti if jti else None
 
         if jti:
-            print(jti.jti)
-            blocklist = TokenBlocklist(jti=jti.jti)
+            blocklist = TokenBlocklist(jti=revoked_jti, expires_at=jti.expires_at)
             db.session.add(blocklist)
             db.session.delete(jti)
 
         db.session.delete(user)
         db.session.commit()
 
+        if revoked_jti:
+            revocation_cache.revoke(revoked_jti)
+        token_versions.invalidate()
+
         return success_response(code=HTTPStatus.OK,
                                 msg='User deleted successfully',
                                 status='OK')
@@ -1,10 +1,9 @@
-from flask import request, abort
-from flask_jwt_extended import get_jwt_identity
-from app import bcrypt
-from flask_restful import Resource
+from flask import request
+from app import revocation_cache, password_hasher, token_versions
+from flask_restful import Resource, abort
 from app.DB.models import User, UserCurrentJWTToken, TokenBlocklist, db
-from app.utils import auth_required, librarian_access, user_summit, success_response
-from flask_jwt_extended import get_jti, get_jwt, create_access_token
+from app.utils import auth_required, librarian_access, user_summit, success_response, load_current_user, get_user
+from flask_jwt_extended import get_jwt, create_access_token, decode_token
 from http import HTTPStatus
 import datetime
 
@@ -39,8 +38,7 @@ class UserRegisterAPI(Resource):
                       error="Password and Conform password doesn't match, Please try again",
                       status='CONFLICT')
 
-            identity = get_jwt_identity()
-            current_user = User.get_by_id(identity['id'])
+            current_user = load_current_user()
 
             user_type = request_data.get('user_type') if current_user.user_type == User.Admin else User.Public
             created_user = User(username=username, email=email, first_name=first_name, last_name=last_name,
@@ -89,21 +87,29 @@ class UserAuthenticationAPI(Resource):
                   error='Your account is deactivated, Please contact library',
                   status='NOT_FOUND')
 
-        if not bcrypt.check_password_hash(user.password_hash, password):
+        if not user.verify_password(password):
             abort(HTTPStatus.FORBIDDEN,
                   error="Invalid password",
                   status='FORBIDDEN')
 
+        # Hashes made with an older BCRYPT_LOG_ROUNDS are upgraded while the plain password is at hand
+        if password_hasher.needs_rehash(user.password_hash):
+            user.password = password
+
         access_token = create_access_token(identity={"id": user.id,
                                                      "role": user.user_type,
-                                                     'active': user.is_active})
+                                                     'active': user.is_active,
+                                                     'ver': user.token_version or 0})
 
+        token_data = decode_token(access_token)
+        expires_at = datetime.datetime.utcfromtimestamp(token_data['exp']) if 'exp' in token_data else None
         user_token = UserCurrentJWTToken.query.filter_by(user_id=user.id).first()
 
         if user_token:
-            user_token.jti = get_jti(access_token)
+            user_token.jti = token_data['jti']
+            user_token.expires_at = expires_at
         else:
-            user_token = UserCurrentJWTToken(user_id=user.id, jti=get_jti(access_token))
+            user_token = UserCurrentJWTToken(user_id=user.id, jti=token_data['jti'], expires_at=expires_at)
 
         db.session.add(user_token)
         db.session.commit()
@@ -130,10 +136,13 @@ class LogoutAPI(Resource):
         API for adding logged out jwt tokens in blocklist
         :return: Success code in JSON response
         """
-        jti = get_jwt().get('jti', '')
-        blocklist = TokenBlocklist(jti=jti)
+        jwt_data = get_jwt()
+        jti = jwt_data.get('jti', '')
+        expires_at = datetime.datetime.utcfromtimestamp(jwt_data['exp']) if 'exp' in jwt_data else None
+        blocklist = TokenBlocklist(jti=jti, expires_at=expires_at)
         db.session.add(blocklist)
         db.session.commit()
+        revocation_cache.revoke(jti)
 
         return success_response(code=HTTPStatus.OK,
                                 msg='Logged out Successfully',
@@ -152,8 +161,7 @@ class PasswordChange(Resource):
 
         :return: Success or error response
         """
-        identity = get_jwt_identity()
-        user = User.get_by_id(identity['id'])
+        user = load_current_user()
 
         request_data = request.json
 
@@ -197,9 +205,8 @@ class UserActivationAPI(Resource):
         :return: Success or error response
         """
         request_data = request.json
-        identity = get_jwt_identity()
-        current_user = User.get_by_id(identity['id'])
-        user = User.get_by_id(_id)
+        current_user = load_current_user()
+        user = get_user(_id)
         is_active = request_data.get('is_active', user.is_active)
 
         if not ((current_user.user_type == User.Librarian and user.user_type == User.Public) or
@@ -208,12 +215,18 @@ class UserActivationAPI(Resource):
                   error="You don't have the permission to access this",
                   status='FORBIDDEN')
 
+        revoke = bool(user.is_active) and not is_active
         user.is_active = is_active
         user.activated_by = current_user
         user.updated_by = repr(current_user)
         user.updated_at = datetime.datetime.utcnow()
+        if revoke:
+            user.revoke_tokens()
         db.session.commit()
 
+        if revoke:
+            token_versions.invalidate()
+
         return user_summit(code=HTTPStatus.OK,
                            data=user,
                            msg='User updated successfully')
@@ -0,0 +1,128 @@
+from flask import current_app, g
+from sqlalchemy import func, select
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from app import db
+from app.utils import cursor_clauses, cursor_page
+from .engine import configure_engine
+from .routing import REPLICA
+
+# Async driver of each backend, the sync URLs of the config are reused with these drivers
+async_drivers = {'sqlite': 'aiosqlite', 'postgresql': 'asyncpg'}
+
+
+def async_url(uri):
+    url = make_url(uri)
+    backend = url.get_backend_name()
+
+    if backend not in async_drivers:
+        raise ValueError(f'No async driver for {backend}')
+
+    return url.set(drivername=f'{backend}+{async_drivers[backend]}')
+
+
+# Async engine options from the DB_POOL_* settings
+def async_engine_options(config, url) -> dict:
+    options = dict(pool_size=config['DB_POOL_SIZE'] or 10,
+                   max_overflow=config['DB_MAX_OVERFLOW'] if config['DB_MAX_OVERFLOW'] is not None else 10,
+                   pool_recycle=config['DB_POOL_RECYCLE'] or -1,
+                   pool_pre_ping=bool(config['DB_POOL_PRE_PING']))
+
+    if config['DB_POOL_TIMEOUT'] is not None:
+        options['pool_timeout'] = config['DB_POOL_TIMEOUT']
+
+    if url.get_backend_name() == 'sqlite':
+        # aiosqlite defaults to NullPool, which starts a connection thread per checkout
+        if not url.database or url.database == ':memory:':
+            return {}
+        options['poolclass'] = AsyncAdaptedQueuePool
+        if config['SQLITE_BUSY_TIMEOUT'] is not None:
+            options['connect_args'] = {'timeout': config['SQLITE_BUSY_TIMEOUT'] / 1000}
+
+    return options
+
+
+def create_engine(uri, config):
+    url = async_url(uri)
+    engine = create_async_engine(url, **async_engine_options(config, url))
+    configure_engine(engine.sync_engine, config)
+
+    return engine
+
+
+class _AsyncDBState:
+    def __init__(self, engine, replica):
+        self.engine = engine
+        self.replica = replica
+
+
+# Async engines for the ASGI entry point, on the same database, models & pragmas as db
+class AsyncDB:
+    """
+    Sessions of resources marked with use_replica read from the replica when one is configured.
+    Nothing is lazy loaded in async code, relationships a view needs have to be loaded eagerly.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        # The URLs of the sync engines, where relative SQLite paths are already resolved against the app
+        with app.app_context():
+            primary_url = db.engine.url
+            has_replica = REPLICA in (app.config.get('SQLALCHEMY_BINDS') or {})
+            replica_url = db.get_engine(app, bind=REPLICA).url if has_replica else None
+
+        engine = create_engine(primary_url, app.config)
+        replica = create_engine(replica_url, app.config) if replica_url is not None else None
+
+        app.extensions['async_db'] = _AsyncDBState(engine, replica)
+
+    @property
+    def state(self) -> _AsyncDBState:
+        return current_app.extensions['async_db']
+
+    def session(self) -> AsyncSession:
+        state = self.state
+        engine = state.replica if state.replica is not None and g.get('use_replica') else state.engine
+
+        return AsyncSession(engine, expire_on_commit=False)
+
+    @staticmethod
+    async def dispose(app) -> None:
+        state = app.extensions['async_db']
+        for engine in (state.engine, state.replica):
+            if engine is not None:
+                await engine.dispose()
+
+
+async_db = AsyncDB()
+
+
+async def count(session: AsyncSession, statement) -> int:
+    return await session.scalar(select(func.count()).select_from(statement.order_by(None).subquery()))
+
+
+# Offset pagination like Flask-SQLAlchemy's paginate(error_out=False), returns (items, previous, next & total)
+async def paginate(session: AsyncSession, statement, page: int, per_page: int) -> tuple:
+    page = max(page, 1)
+    per_page = 20 if per_page < 0 else per_page
+    total = await count(session, statement)
+    items = (await session.execute(statement.limit(per_page).offset((page - 1) * per_page))).all()
+
+    return items, dict(previous=page - 1 if page > 1 else None,
+                       next=page + 1 if page * per_page < total else None,
+                       total=total)
+
+
+# Keyset (cursor) pagination, see app.utils.cursor_paginate
+async def cursor_paginate(session: AsyncSession, statement, keys, cursor: str, per_page: int,
+                          with_total=False) -> tuple:
+    total = await count(session, statement) if with_total else None
+    filters, order = cursor_clauses(keys, cursor)
+    result = await session.execute(statement.filter(*filters).order_by(*order).limit(per_page + 1))
+    items, next_cursor = cursor_page(result.all(), keys, per_page)
+
+    return items, dict(next_cursor=next_cursor, total=total)
@@ -0,0 +1,122 @@
+from app import db
+from app.utils import cursor_clauses, encode_cursor
+from app.API.views.book_api import book_list_filters, book_reviews_statement, book_categories_statement, \
+    history_filters, book_list_serializer, history_serializer
+from .models import User, Category, Book, BookReview, History, Loan, TokenBlocklist, UserCurrentJWTToken
+from .search import LikeSearchBackend
+import datetime
+import re
+
+# Placeholder values, plans depend on the query shape and the indexes, not on the rows matched
+sample_id = 'audit'
+sample_date = datetime.datetime(2000, 1, 1)
+# Identities of the public & staff visibility rules of the list endpoints
+public = {'role': User.Public, 'id': sample_id}
+staff = {'role': User.Admin, 'id': sample_id}
+# Sort keys of the cursor pages, as passed to cursor_paginate by the views
+book_cursor_keys = ((Book.title, False), (Book.id, False))
+history_cursor_keys = ((History.date, True), (History.id, True))
+
+
+# Book list query as BookCreateListAPI.get builds it, matches replace the search of the configured backend
+def book_list_query(args: dict, identity: dict, cursor: str = None, matches=None):
+    filters, search_matches = book_list_filters(args, identity)
+    matches = search_matches if matches is None else matches
+    query = Book.query.with_entities(*book_list_serializer.columns).filter(*filters)
+
+    if matches is not None:
+        return query.join(matches, matches.c.book_id == Book.id).order_by(matches.c.rank, Book.title).limit(10)
+    if cursor is not None:
+        cursor_filters, order = cursor_clauses(book_cursor_keys, cursor)
+        return query.filter(*cursor_filters).order_by(*order).limit(11)
+
+    return query.order_by(Book.title).limit(10)
+
+
+# History query as HistoryAPI.get builds it
+def history_query(args: dict, identity: dict, cursor: str = None):
+    query = History.query.with_entities(*history_serializer.columns).filter(*history_filters(args, identity))
+
+    if cursor is not None:
+        cursor_filters, order = cursor_clauses(history_cursor_keys, cursor)
+        return query.filter(*cursor_filters).order_by(*order).limit(11)
+
+    return query.order_by(History.date.desc()).limit(10)
+
+
+# The queries the endpoints run, built by the view helpers where the views have them
+endpoint_queries = {
+    'book list (public)': lambda: book_list_query({}, public),
+    'book list (staff)': lambda: book_list_query({}, staff),
+    'book list by category': lambda: book_list_query({'category': sample_id}, public),
+    'book list cursor': lambda: book_list_query({}, public, cursor=encode_cursor([sample_id, sample_id])),
+    'book search': lambda: book_list_query({'q': sample_id}, public),
+    'book list by title & author': lambda: book_list_query({'title': sample_id, 'author': sample_id}, public),
+    'book search (LIKE backend)': lambda: book_list_query({}, public, matches=LikeSearchBackend().search(q=sample_id)),
+    'book detail': lambda: Book.query.options(db.joinedload(Book.added_by)).filter_by(id=sample_id),
+    'book detail reviews': lambda: book_reviews_statement(sample_id, 1, 10),
+    'book detail categories': lambda: book_categories_statement(sample_id),
+    'can review': lambda: History.query.filter_by(user_id=sample_id, book_id=sample_id).limit(1),
+    'my review': lambda: BookReview.query.filter_by(user_id=sample_id, book_id=sample_id).limit(1),
+    'my books': lambda: db.session.query(Book.id, Book.title, BookReview)
+                                  .join(Loan, Loan.book_id == Book.id)
+                                  .outerjoin(BookReview, (BookReview.book_id == Book.id) &
+                                             (BookReview.user_id == sample_id))
+                                  .filter(Loan.user_id == sample_id, Loan.returned_at.is_(None))
+                                  .order_by(Loan.borrowed_at.desc()).limit(10),
+    'active loan': lambda: Loan.query.filter_by(user_id=sample_id, book_id=sample_id, returned_at=None),
+    'overdue loans': lambda: Loan.query.filter(Loan.returned_at.is_(None), Loan.due_at < sample_date)
+                                       .order_by(Loan.due_at),
+    'history (public)': lambda: history_query({}, public),
+    'history (staff)': lambda: history_query({}, staff),
+    'history by book title': lambda: history_query({'book_title': sample_id}, staff),
+    'history cursor': lambda: history_query({}, public, cursor=encode_cursor([sample_date, sample_id])),
+    'category list': lambda: Category.query.order_by(Category.name),
+    'user list': lambda: User.query.filter(User.id.isnot(None)).order_by(User.username).limit(10),
+    'login by username': lambda: User.query.filter_by(username=sample_id).limit(1),
+    'login by email': lambda: User.query.filter_by(email=sample_id).limit(1),
+    'current token': lambda: UserCurrentJWTToken.query.filter_by(user_id=sample_id).limit(1),
+    'token revoked': lambda: TokenBlocklist.query.filter_by(jti=sample_id).limit(1),
+    'expired tokens': lambda: db.session.query(TokenBlocklist.id).filter(TokenBlocklist.expires_at < sample_date)
+                                        .limit(1000),
+}
+
+# EXPLAIN prefix, plan lines reading the whole table & plan lines sorting the rows, per dialect
+# A MATCH on an FTS5 table shows as a SCAN of the virtual table with an M in its index string
+explain_dialects = {
+    'sqlite': ('EXPLAIN QUERY PLAN', re.compile(r'\bSCAN (?!.*\b(?:USING|VIRTUAL TABLE INDEX \d+:M))'),
+               re.compile(r'\bTEMP B-TREE\b')),
+    'postgresql': ('EXPLAIN', re.compile(r'\bSeq Scan\b'), re.compile(r'\bSort\b')),
+}
+
+
+# Plan lines of a Query or a select statement
+def explain(query) -> list:
+    prefix, _, _ = explain_dialects[db.engine.dialect.name]
+    statement = getattr(query, 'statement', query)
+    compiled = statement.compile(dialect=db.engine.dialect, compile_kwargs={'render_postcompile': True})
+    params = compiled.params
+
+    if compiled.positiontup is not None:
+        params = tuple(params[name] for name in compiled.positiontup)
+
+    with db.engine.connect() as connection:
+        rows = connection.exec_driver_sql(f'{prefix} {compiled.string}', params).fetchall()
+
+    return [row[-1] for row in rows]
+
+
+# Plans of every endpoint query, [(name, plan lines, full scan lines, sort lines)]
+def audit_queries() -> list:
+    if db.engine.dialect.name not in explain_dialects:
+        raise ValueError(f'Query audit does not support {db.engine.dialect.name}')
+
+    _, full_scan, sort = explain_dialects[db.engine.dialect.name]
+    results = []
+
+    for name, build in endpoint_queries.items():
+        plan = explain(build())
+        results.append((name, plan, [line for line in plan if full_scan.search(line)],
+                        [line for line in plan if sort.search(line)]))
+
+    return results
@@ -0,0 +1,213 @@
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from app import db, response_cache
+from .models import Book, Category, category_book, generate_id
+from .search import book_search
+import csv
+import datetime
+import json
+
+# Supported feed formats
+CSV = 'csv'
+NDJSON = 'ndjson'
+# Errors kept in the report, the rest are only counted
+MAX_REPORTED_ERRORS = 1000
+
+
+# Rows of a CSV (header line, categories separated by |) or JSON-lines feed, as (line number, dict or error)
+def read_rows(stream, fmt: str):
+    if fmt == CSV:
+        reader = csv.DictReader(stream)
+        for row in reader:
+            row['categories'] = [name for name in (row.get('categories') or '').split('|') if name.strip()]
+            yield reader.line_num, row
+        return
+
+    for line_num, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_num, 'Invalid JSON'
+            continue
+        yield line_num, row if isinstance(row, dict) else 'Expected a JSON object'
+
+
+# Whole number from a feed value, fractional counts are rejected rather than truncated
+def whole_number(value) -> int:
+    if isinstance(value, bool) or isinstance(value, float) and not value.is_integer():
+        raise ValueError(value)
+
+    return int(value)
+
+
+class BookImporter:
+    """
+    Imports rows in batches, one executemany per table & one transaction per batch.
+
+    Rows are validated against in-memory title & category maps before the batch is written, so a bad row
+    is reported & skipped without failing its batch.
+    """
+
+    def __init__(self, user_id: str, batch_size: int = 1000, create_categories: bool = False):
+        self.user_id = user_id
+        self.batch_size = batch_size
+        self.create_categories = create_categories
+        self.titles = {title for title, in db.session.query(Book.title)}
+        self.categories = {name: _id for _id, name in db.session.query(Category.id, Category.name)}
+        self.new_categories = []
+        self.created_categories = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, line_num: int, message: str) -> None:
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(dict(line=line_num, error=message))
+
+    def category_id(self, name: str):
+        name = name.strip().lower()
+        if name not in self.categories and self.create_categories:
+            self.categories[name] = generate_id()
+            self.new_categories.append(dict(id=self.categories[name], name=name, user_id=self.user_id))
+
+        return self.categories.get(name)
+
+    def prepare(self, line_num: int, row):
+        if isinstance(row, str):
+            return self.error(line_num, row)
+
+        try:
+            book = dict(title=row['title'].strip().lower(),
+                        author=row['author'].strip().lower(),
+                        short_description=(row.get('short_description') or '').strip().lower(),
+                        full_description=(row.get('full_description') or '').strip().lower(),
+                        count=whole_number(row.get('count') or 0))
+        except (KeyError, AttributeError):
+            return self.error(line_num, 'title & author are required')
+        except (ValueError, TypeError):
+            return self.error(line_num, 'count must be a whole number')
+
+        if not book['title'] or not book['author']:
+            return self.error(line_num, 'title & author are required')
+        if book['count'] < 0:
+            return self.error(line_num, 'count must not be negative')
+        if book['title'] in self.titles:
+            return self.error(line_num, f"Book already exists: {book['title']}")
+
+        names = row.get('categories') or []
+        if not isinstance(names, list):
+            return self.error(line_num, 'categories must be a list of names')
+
+        category_ids = [self.category_id(str(name)) for name in names]
+        if None in category_ids:
+            missing = [name for name, _id in zip(names, category_ids) if _id is None]
+            return self.error(line_num, f"Unknown categories: {', '.join(map(str, missing))}")
+
+        now = datetime.datetime.utcnow()
+        book.update(id=generate_id(), user_id=self.user_id, created_at=now, updated_at=now,
+                    overall_rating=0, total_rating=0, total_review=0)
+        self.titles.add(book['title'])
+
+        return line_num, book, set(category_ids)
+
+    def write(self, batch: list) -> None:
+        books = [book for _, book, _ in batch]
+        links = [dict(book_id=book['id'], category_id=category_id)
+                 for _, book, category_ids in batch for category_id in category_ids]
+
+        db.session.execute(Book.__table__.insert(), books)
+        if links:
+            db.session.execute(category_book.insert(), links)
+        # Core inserts skip the mapper events that keep the search index in sync
+        book_search.backend.index_books(db.session.connection(), [book['id'] for book in books])
+        db.session.commit()
+
+        self.imported += len(books)
+
+    def write_categories(self) -> dict:
+        """Inserts the pending categories, returns the error of each one that could not be written by id"""
+        categories, self.new_categories = self.new_categories, []
+        try:
+            db.session.execute(Category.__table__.insert(), categories)
+            db.session.commit()
+            self.created_categories += len(categories)
+            return {}
+        except IntegrityError:
+            # Some name was created by a concurrent write, the categories are retried one by one to find it
+            db.session.rollback()
+
+        failed = {}
+        for category in categories:
+            try:
+                db.session.execute(Category.__table__.insert(), [category])
+                db.session.commit()
+                self.created_categories += 1
+            except IntegrityError as e:
+                db.session.rollback()
+                failed[category['id']] = str(e.orig)
+                # Later rows link to the category written by the concurrent import
+                existing = db.session.query(Category.id).filter_by(name=category['name']).scalar()
+                if existing is None:
+                    self.categories.pop(category['name'], None)
+                else:
+                    self.categories[category['name']] = existing
+
+        return failed
+
+    def flush(self, batch: list) -> None:
+        failed = self.write_categories() if self.new_categories else {}
+        if failed:
+            # Rows of this batch still point at the category that was not written
+            kept = []
+            for line_num, book, category_ids in batch:
+                error = next((failed[_id] for _id in category_ids if _id in failed), None)
+                if error is None:
+                    kept.append((line_num, book, category_ids))
+                else:
+                    self.titles.discard(book['title'])
+                    self.error(line_num, error)
+            batch = kept
+
+        if not batch:
+            return
+
+        try:
+            self.write(batch)
+        except IntegrityError:
+            # Some row conflicts with a concurrent write, the batch is retried row by row to find it
+            db.session.rollback()
+            for line_num, book, category_ids in batch:
+                try:
+                    self.write([(line_num, book, category_ids)])
+                except IntegrityError as e:
+                    db.session.rollback()
+                    self.error(line_num, str(e.orig))
+
+    def run(self, rows) -> dict:
+        batch = []
+        for line_num, row in rows:
+            prepared = self.prepare(line_num, row)
+            if prepared:
+                batch.append(prepared)
+            if len(batch) >= self.batch_size:
+                self.flush(batch)
+                batch = []
+        self.flush(batch)
+
+        if self.imported:
+            response_cache.invalidate('books')
+        if self.created_categories:
+            response_cache.invalidate('categories')
+            current_app.extensions['category_list_cache'].invalidate()
+
+        return dict(imported=self.imported, failed=self.failed, created_categories=self.created_categories,
+                    errors=self.errors)
+
+
+# Importing a CSV or JSON-lines feed of books, returns the counts & the per row errors
+def import_books(stream, fmt: str, user_id: str, batch_size: int = 1000, create_categories: bool = False) -> dict:
+    importer = BookImporter(user_id, batch_size=batch_size, create_categories=create_categories)
+    return importer.run(read_rows(stream, fmt))
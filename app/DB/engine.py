@@ -0,0 +1,63 @@
+from sqlalchemy import event
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import QueuePool
+
+
+# SQLALCHEMY_ENGINE_OPTIONS from the DB_POOL_* settings
+def engine_options(config) -> dict:
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    pool = {'pool_size': config['DB_POOL_SIZE'],
+            'max_overflow': config['DB_MAX_OVERFLOW'],
+            'pool_timeout': config['DB_POOL_TIMEOUT']}
+    pool = {key: value for key, value in pool.items() if value is not None}
+    options = {}
+
+    if config['DB_POOL_RECYCLE'] is not None:
+        options['pool_recycle'] = config['DB_POOL_RECYCLE']
+    if config['DB_POOL_PRE_PING']:
+        options['pool_pre_ping'] = True
+
+    if url.get_backend_name() == 'sqlite':
+        # In-memory databases keep Flask-SQLAlchemy's single connection pool
+        if not url.database or url.database == ':memory:':
+            return options
+
+        # File databases default to NullPool, a sized pool needs QueuePool & connections usable across threads
+        if pool:
+            options.update(pool, poolclass=QueuePool, connect_args={'check_same_thread': False})
+        if config['SQLITE_BUSY_TIMEOUT'] is not None:
+            options.setdefault('connect_args', {})['timeout'] = config['SQLITE_BUSY_TIMEOUT'] / 1000
+        return options
+
+    options.update(pool)
+    return options
+
+
+# Applying the SQLITE_* pragmas on every new connection of the engine
+def configure_engine(engine, config) -> None:
+    if engine.dialect.name != 'sqlite':
+        return
+
+    pragmas = [('journal_mode', config['SQLITE_JOURNAL_MODE']),
+               ('synchronous', config['SQLITE_SYNCHRONOUS']),
+               ('busy_timeout', config['SQLITE_BUSY_TIMEOUT']),
+               ('mmap_size', config['SQLITE_MMAP_SIZE'])]
+    pragmas = [(name, value) for name, value in pragmas if value is not None]
+
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas:
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+
+
+# Dropping the pooled connections of every engine, e.g. in a worker forked from a preloaded master
+def dispose_engines(db, app) -> None:
+    with app.app_context():
+        db.engine.dispose()
+        for bind in app.config.get('SQLALCHEMY_BINDS') or {}:
+            db.get_engine(app, bind=bind).dispose()
@@ -0,0 +1,240 @@
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateIndex
+from app import db
+from app.utils import migrate_borrowed_books
+from .models import User, Book, BookReview, History, Loan, TokenBlocklist, UserCurrentJWTToken, PublicId, ID_STORAGE, \
+    category_book
+from .search import book_search
+import datetime
+import time
+
+# Applied versions, kept outside the model metadata so create_all never touches it
+schema_version = db.Table('schema_version', db.MetaData(),
+                          db.Column('version', db.Integer, primary_key=True),
+                          db.Column('description', db.String(250)),
+                          db.Column('applied_at', db.DateTime),
+                          db.Column('duration_ms', db.Integer))
+
+# Registered migrations in version order
+migrations = []
+
+
+class Migration:
+    def __init__(self, version: int, description: str, upgrade):
+        self.version = version
+        self.description = description
+        self.upgrade = upgrade
+
+
+# Registering a migration step, upgrade(log) must be safe to re-run on a partially migrated database
+def migration(version: int, description: str):
+    def decorator(fn):
+        assert not migrations or migrations[-1].version < version, 'Migrations must be declared in order'
+        migrations.append(Migration(version, description, fn))
+        return fn
+
+    return decorator
+
+
+def add_column(table, column) -> bool:
+    if column.name in {existing['name'] for existing in inspect(db.engine).get_columns(table.name)}:
+        return False
+
+    column_type = column.type.compile(dialect=db.engine.dialect)
+    with db.engine.begin() as connection:
+        connection.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}')
+    return True
+
+
+# Creating the indexes declared on the models that the database is missing
+def create_indexes(*tables, log=print) -> None:
+    """
+    Postgres builds each index CONCURRENTLY so writes keep flowing, other backends build it in one
+    statement & lock the table meanwhile.
+    """
+    engine = db.engine
+
+    for table in tables:
+        existing = {index['name'] for index in inspect(engine).get_indexes(table.name)}
+
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            if index.name in existing:
+                continue
+
+            ddl = str(CreateIndex(index).compile(dialect=engine.dialect))
+            started = time.perf_counter()
+
+            if engine.dialect.name == 'postgresql':
+                with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+                    connection.exec_driver_sql(ddl.replace('CREATE INDEX', 'CREATE INDEX CONCURRENTLY', 1)
+                                                  .replace('CREATE UNIQUE INDEX', 'CREATE UNIQUE INDEX CONCURRENTLY', 1))
+            else:
+                with engine.begin() as connection:
+                    connection.exec_driver_sql(ddl)
+
+            log(f'  created index {index.name} in {(time.perf_counter() - started) * 1000:.0f}ms')
+
+
+# True when the primary key or the id storage of the table differ from the model
+def needs_rebuild(table) -> bool:
+    inspector = inspect(db.engine)
+    if inspector.get_pk_constraint(table.name)['constrained_columns'] != [column.name for column in table.primary_key]:
+        return True
+
+    storage = {column['name']: column['type'] for column in inspector.get_columns(table.name)}
+    return any(isinstance(storage[column.name], db.LargeBinary) != (ID_STORAGE == 'binary')
+               for column in table.columns if isinstance(column.type, PublicId) and column.name in storage)
+
+
+# Recreating a table from its model & copying the rows over, ids are converted to the configured storage
+def rebuild_table(table, log=print, batch_size: int = 1000) -> None:
+    """
+    SQLite cannot alter a primary key, so the table is renamed, created again & filled in batches.
+    legacy_alter_table keeps the foreign keys of the other tables pointing at the new table.
+    """
+    engine = db.engine
+    inspector = inspect(engine)
+    started = time.perf_counter()
+
+    if engine.dialect.name != 'sqlite':
+        if ID_STORAGE == 'binary':
+            raise NotImplementedError('Converting ids to binary is only supported on SQLite')
+
+        constraint = inspector.get_pk_constraint(table.name)['name']
+        key = ', '.join(column.name for column in table.primary_key)
+        with engine.begin() as connection:
+            connection.exec_driver_sql(f'ALTER TABLE "{table.name}" DROP CONSTRAINT "{constraint}", '
+                                       f'ADD PRIMARY KEY ({key})')
+        log(f'  changed the primary key of {table.name} in {(time.perf_counter() - started) * 1000:.0f}ms')
+        return
+
+    existing = {column['name'] for column in inspector.get_columns(table.name)}
+    indexes = [index['name'] for index in inspector.get_indexes(table.name)]
+    columns = [column for column in table.columns if column.name in existing]
+    # Ids are read raw, as text or bytes, & handed to the model type as strings
+    ids = [isinstance(column.type, PublicId) for column in columns]
+    old = db.Table(f'{table.name}__old', db.MetaData(),
+                   *[db.Column(column.name, None if is_id else column.type) for column, is_id in zip(columns, ids)])
+    to_string = PublicId().process_result_value
+    rows = 0
+
+    with engine.begin() as connection:
+        # pysqlite does not open a transaction for DDL by itself, the rebuild has to be all or nothing
+        connection.exec_driver_sql('BEGIN')
+        connection.exec_driver_sql('PRAGMA legacy_alter_table = ON')
+        connection.exec_driver_sql(f'ALTER TABLE "{table.name}" RENAME TO "{old.name}"')
+        for name in indexes:
+            connection.exec_driver_sql(f'DROP INDEX "{name}"')
+        table.create(connection)
+
+        result = connection.execute(old.select())
+        keys = [column.key for column in columns]
+        for batch in result.partitions(batch_size):
+            connection.execute(table.insert(), [{key: to_string(value, None) if is_id else value
+                                                 for key, value, is_id in zip(keys, row, ids)} for row in batch])
+            rows += len(batch)
+
+        connection.exec_driver_sql(f'DROP TABLE "{old.name}"')
+        connection.exec_driver_sql('PRAGMA legacy_alter_table = OFF')
+
+    # The search index holds the stored book ids, which the copy may convert, an index on rowids is replaced
+    if table is Book.__table__ and not book_search.create_index():
+        book_search.rebuild()
+
+    log(f'  rebuilt {table.name} ({rows} rows) in {(time.perf_counter() - started) * 1000:.0f}ms')
+
+
+def rebuild_tables(log=print) -> list:
+    rebuilt = [table.name for table in db.metadata.sorted_tables if needs_rebuild(table)]
+    for name in rebuilt:
+        rebuild_table(db.metadata.tables[name], log=log)
+
+    return rebuilt
+
+
+def applied_versions() -> dict:
+    schema_version.create(db.engine, checkfirst=True)
+    with db.engine.connect() as connection:
+        return {row.version: row for row in connection.execute(schema_version.select())}
+
+
+# Applying every pending migration in order, returns the versions applied
+def upgrade(log=print) -> list:
+    applied = applied_versions()
+    done = []
+
+    for step in migrations:
+        if step.version in applied:
+            continue
+
+        log(f'{step.version:03d} {step.description}')
+        started = time.perf_counter()
+        step.upgrade(log)
+        duration_ms = round((time.perf_counter() - started) * 1000)
+
+        with db.engine.begin() as connection:
+            connection.execute(schema_version.insert().values(version=step.version, description=step.description,
+                                                              applied_at=datetime.datetime.utcnow(),
+                                                              duration_ms=duration_ms))
+        log(f'{step.version:03d} done in {duration_ms}ms')
+        done.append(step.version)
+
+    return done
+
+
+# Status of every registered migration, (migration, applied row or None)
+def status() -> list:
+    applied = applied_versions()
+    return [(step, applied.get(step.version)) for step in migrations]
+
+
+@migration(1, 'baseline schema')
+def baseline(log) -> None:
+    # Creates missing tables with their indexes, existing tables are left as they are
+    db.create_all()
+
+
+@migration(2, 'token expiry columns')
+def token_expiry_columns(log) -> None:
+    for model in (UserCurrentJWTToken, TokenBlocklist):
+        if add_column(model.__table__, model.__table__.c.expires_at):
+            log(f'  added {model.__tablename__}.expires_at')
+
+
+@migration(3, 'loans from the legacy book_borrowed lists')
+def borrowed_books_to_loans(log) -> None:
+    log(f'  migrated {migrate_borrowed_books()} borrowed books')
+
+
+@migration(4, 'review, category, loan & token indexes')
+def performance_indexes(log) -> None:
+    create_indexes(BookReview.__table__, category_book, Loan.__table__,
+                   UserCurrentJWTToken.__table__, TokenBlocklist.__table__, log=log)
+
+
+@migration(5, 'book search index')
+def search_index(log) -> None:
+    if book_search.create_index():
+        log('  built the book search index')
+
+
+@migration(6, 'history, available book & category_book lookup indexes')
+def query_shape_indexes(log) -> None:
+    create_indexes(History.__table__, Book.__table__, category_book, log=log)
+
+
+@migration(7, 'id as the sole primary key of user & history, ids in the configured storage')
+def sole_id_primary_keys(log) -> None:
+    rebuild_tables(log=log)
+
+
+@migration(8, 'user token versions')
+def user_token_versions(log) -> None:
+    if add_column(User.__table__, User.__table__.c.token_version):
+        log('  added user.token_version')
+
+
+@migration(9, 'book search index keyed on book ids')
+def search_index_book_ids(log) -> None:
+    if book_search.create_index():
+        log('  rebuilt the book search index on book ids')
@@ -1,11 +1,49 @@
-from app import db, bcrypt
+from app import db, password_hasher
 from flask_restful import abort
 from http import HTTPStatus
 import uuid
 import datetime
+import json
+import os
+import time
 
-# For generating UUID
-generate_id = lambda: str(uuid.uuid4())
+# How ids are stored, `string` (36 char text) or `binary` (16 bytes), the API always sees strings
+ID_STORAGE = os.environ.get('LMS_ID_STORAGE', 'string')
+
+
+# For generating time ordered UUIDs (UUIDv7 layout), new rows land at the end of the id index
+def generate_id() -> str:
+    value = (time.time_ns() // 1_000_000) << 80 | int.from_bytes(os.urandom(10), 'big')
+    value = value & ~(0xF << 76) | 0x7 << 76
+    value = value & ~(0x3 << 62) | 0x2 << 62
+    return str(uuid.UUID(int=value))
+
+
+# Id column type, strings in Python whatever the storage
+class PublicId(db.TypeDecorator):
+    impl = db.String(40)
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if ID_STORAGE == 'binary':
+            return dialect.type_descriptor(db.LargeBinary(16))
+        return dialect.type_descriptor(db.String(40))
+
+    def process_bind_param(self, value, dialect):
+        if ID_STORAGE != 'binary' or not isinstance(value, str):
+            return value
+
+        # Ids which are not UUIDs (e.g. a mistyped URL) are kept as their raw bytes & simply match nothing
+        try:
+            return uuid.UUID(value).bytes
+        except ValueError:
+            return value.encode()
+
+    def process_result_value(self, value, dialect):
+        if not isinstance(value, bytes):
+            return value
+
+        return str(uuid.UUID(bytes=value)) if len(value) == 16 else value.decode()
 
 
 # User Model
@@ -16,9 +54,9 @@ class User(db.Model):
     Librarian = 'Librarian'
     Public = 'Public'
 
-    id = db.Column(db.String(40), primary_key=True, unique=True, default=generate_id)
-    username = db.Column(db.String(150), primary_key=True, unique=True, index=True)
-    email = db.Column(db.String(150), primary_key=True, unique=True, index=True)
+    id = db.Column(PublicId, primary_key=True, default=generate_id)
+    username = db.Column(db.String(150), unique=True, index=True)
+    email = db.Column(db.String(150), unique=True, index=True)
     phone = db.Column(db.String(20), index=True)
     password_hash = db.Column(db.String(500))
     user_type = db.Column(db.String(15), index=True)
@@ -30,16 +68,20 @@ class User(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     updated_by = db.Column(db.String(250), nullable=True)
-    book_borrowed = db.Column(db.Text, nullable=True, default='[]')
+    # Bumped on deactivation, role change & delete, tokens issued with an older version are rejected
+    token_version = db.Column(db.Integer, default=0, server_default='0')
+    # Legacy JSON list of borrowed book ids, superseded by Loan
+    borrowed_json = db.Column('book_borrowed', db.Text, nullable=True, default='[]')
 
     # Foreign Key
-    activated_user_id = db.Column(db.String(40), db.ForeignKey('user.id'), nullable=True)
+    activated_user_id = db.Column(PublicId, db.ForeignKey('user.id'), nullable=True)
 
     # Relationship
     activated_by = db.relationship('User', backref='activated_users_by_me', lazy=True, remote_side=id)
     added_categories = db.relationship('Category', backref='added_by', lazy=True)
     added_books = db.relationship('Book', backref='added_by', lazy=True)
     review = db.relationship('BookReview', backref='user', lazy=True)
+    loans = db.relationship('Loan', backref='user', lazy=True, cascade='all, delete-orphan')
 
     @property
     def password(self):
@@ -47,14 +89,22 @@ class User(db.Model):
 
     @password.setter
     def password(self, pwd):
-        self.password_hash = bcrypt.generate_password_hash(pwd).decode('utf8')
+        self.password_hash = password_hasher.generate(pwd)
 
     def verify_password(self, pwd):
-        return bcrypt.check_password_hash(self.password_hash, pwd)
+        return password_hasher.check(self.password_hash, pwd)
+
+    def revoke_tokens(self):
+        """Invalidates every token issued so far, call token_versions.invalidate() after the commit"""
+        self.token_version = (self.token_version or 0) + 1
 
     def review_book_ids(self):
         return dict(map(lambda x: (x.book_id, x), self.review))
 
+    @property
+    def book_borrowed(self):
+        return json.dumps([loan.book_id for loan in Loan.active_for_user(self.id)])
+
     @staticmethod
     def get_by_id(_id):
         user = User.query.filter_by(id=_id).first()
@@ -69,19 +119,21 @@ class User(db.Model):
 
 
 category_book = db.Table('category_book',
-                         db.Column('category_id', db.String(40), db.ForeignKey('category.id')),
-                         db.Column('book_id', db.String(40), db.ForeignKey('book.id')))
+                         db.Column('category_id', PublicId, db.ForeignKey('category.id')),
+                         db.Column('book_id', PublicId, db.ForeignKey('book.id')),
+                         db.Index('ix_category_book_category_id_book_id', 'category_id', 'book_id'),
+                         db.Index('ix_category_book_book_id_category_id', 'book_id', 'category_id'))
 
 
 # Category Model
 class Category(db.Model):
     __tablename__ = "category"
-    id = db.Column(db.String(40), primary_key=True, unique=True, default=generate_id)
+    id = db.Column(PublicId, primary_key=True, default=generate_id)
     name = db.Column(db.String(50), unique=True, index=True)
     created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     updated_by = db.Column(db.String(250), nullable=True)
-    user_id = db.Column(db.String(40), db.ForeignKey('user.id'))
+    user_id = db.Column(PublicId, db.ForeignKey('user.id'))
 
     # Relationship
     books = db.relationship('Book', secondary=category_book, backref='category', lazy=True)
@@ -102,7 +154,12 @@ class Category(db.Model):
 # Book Model
 class Book(db.Model):
     __tablename__ = "book"
-    id = db.Column(db.String(40), primary_key=True, unique=True, default=generate_id)
+    # Public book list, only books with copies left in title order
+    __table_args__ = (db.Index('ix_book_available_title_id', 'title', 'id',
+                               sqlite_where=db.text('count IS NOT 0'),
+                               postgresql_where=db.text('count IS DISTINCT FROM 0')),)
+
+    id = db.Column(PublicId, primary_key=True, default=generate_id)
     title = db.Column(db.String(650), unique=True, index=True)
     author = db.Column(db.String(150), index=True)
     short_description = db.Column(db.String(650))
@@ -114,20 +171,32 @@ class Book(db.Model):
     overall_rating = db.Column(db.Float, default=0, index=True)
     total_rating = db.Column(db.Integer, default=0)
     total_review = db.Column(db.Integer, default=0)
-    user_id = db.Column(db.String(40), db.ForeignKey('user.id'))
+    user_id = db.Column(PublicId, db.ForeignKey('user.id'))
 
     # Relationship
     review = db.relationship('BookReview', backref='book', lazy=True)
+    loans = db.relationship('Loan', backref='book', lazy=True, cascade='all, delete-orphan')
 
     @staticmethod
-    def get_by_id(_id):
-        book = Book.query.filter_by(id=_id).first()
+    def get_by_id(_id, *options):
+        book = Book.query.options(*options).filter_by(id=_id).first()
 
         if not book:
             abort(HTTPStatus.NOT_FOUND, code=HTTPStatus.NOT_FOUND, error='Book not found', staus='NOT_FOUND')
 
         return book
 
+    @staticmethod
+    def take_copy(_id) -> bool:
+        # Single conditional UPDATE, so concurrent borrows can never push the count below zero
+        updated = Book.query.filter(Book.id == _id, Book.count > 0) \
+                            .update({Book.count: Book.count - 1}, synchronize_session=False)
+        return updated == 1
+
+    @staticmethod
+    def put_back_copy(_id) -> None:
+        Book.query.filter(Book.id == _id).update({Book.count: Book.count + 1}, synchronize_session=False)
+
     def __repr__(self):
         return self.title
 
@@ -135,14 +204,17 @@ class Book(db.Model):
 # Book Review Model
 class BookReview(db.Model):
     __tablename__ = "book_review"
-    id = db.Column(db.String(40), primary_key=True, unique=True, default=generate_id)
+    __table_args__ = (db.Index('ix_book_review_book_id_create_at', 'book_id', 'create_at'),
+                      db.Index('ix_book_review_user_id_book_id', 'user_id', 'book_id'))
+
+    id = db.Column(PublicId, primary_key=True, default=generate_id)
     rating = db.Column(db.Integer, index=True)
     review = db.Column(db.String(650))
     create_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
 
     # ForeignKey
-    book_id = db.Column(db.String(40), db.ForeignKey('book.id'))
-    user_id = db.Column(db.String(40), db.ForeignKey('user.id'))
+    book_id = db.Column(PublicId, db.ForeignKey('book.id'))
+    user_id = db.Column(PublicId, db.ForeignKey('user.id'))
 
     @staticmethod
     def get_by_id(_id):
@@ -178,12 +250,16 @@ class BookReview(db.Model):
 # History Model
 class History(db.Model):
     __tablename__ = "history"
+    __table_args__ = (db.Index('ix_history_user_id_date', 'user_id', 'date'),
+                      db.Index('ix_history_user_id_book_id', 'user_id', 'book_id'),
+                      db.Index('ix_history_date', 'date'))
+
     borrow_book = 'Borrow'
     return_book = 'Return'
 
-    id = db.Column(db.String(40), primary_key=True, unique=True, default=generate_id)
-    user_id = db.Column(db.String(40), primary_key=True)
-    book_id = db.Column(db.String(40), primary_key=True)
+    id = db.Column(PublicId, primary_key=True, default=generate_id)
+    user_id = db.Column(PublicId, nullable=False)
+    book_id = db.Column(PublicId, nullable=False)
     book_title = db.Column(db.String(650), index=True)
     user_name = db.Column(db.String(650), index=True)
     date = db.Column(db.DateTime, default=datetime.datetime.utcnow)
@@ -211,20 +287,70 @@ class History(db.Model):
         return self.id
 
 
+# Book Loan Model
+class Loan(db.Model):
+    __tablename__ = "loan"
+    __table_args__ = (db.Index('ix_loan_user_id_returned_at', 'user_id', 'returned_at'),
+                      db.Index('ix_loan_book_id_returned_at', 'book_id', 'returned_at'),
+                      db.Index('ix_loan_returned_at_due_at', 'returned_at', 'due_at'),
+                      # A user can hold only one copy of a book at a time
+                      db.Index('uq_loan_active_user_id_book_id', 'user_id', 'book_id', unique=True,
+                               sqlite_where=db.text('returned_at IS NULL'),
+                               postgresql_where=db.text('returned_at IS NULL')))
+
+    id = db.Column(PublicId, primary_key=True, default=generate_id)
+    borrowed_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    due_at = db.Column(db.DateTime)
+    returned_at = db.Column(db.DateTime, nullable=True)
+
+    # ForeignKey
+    user_id = db.Column(PublicId, db.ForeignKey('user.id'), nullable=False)
+    book_id = db.Column(PublicId, db.ForeignKey('book.id'), nullable=False)
+
+    @staticmethod
+    def get_active(user_id, book_id):
+        return Loan.query.filter_by(user_id=user_id, book_id=book_id, returned_at=None).first()
+
+    @staticmethod
+    def close(_id, returned_at) -> bool:
+        # Only the first of several concurrent returns closes the loan
+        updated = Loan.query.filter(Loan.id == _id, Loan.returned_at.is_(None)) \
+                            .update({Loan.returned_at: returned_at}, synchronize_session=False)
+        return updated == 1
+
+    @staticmethod
+    def active_for_user(user_id):
+        return Loan.query.filter_by(user_id=user_id, returned_at=None).order_by(Loan.borrowed_at.desc())
+
+    @staticmethod
+    def current_holders(book_id):
+        return Loan.query.filter_by(book_id=book_id, returned_at=None)
+
+    @staticmethod
+    def overdue(now=None):
+        now = now or datetime.datetime.utcnow()
+        return Loan.query.filter(Loan.returned_at.is_(None), Loan.due_at < now).order_by(Loan.due_at)
+
+    def __repr__(self):
+        return self.id
+
+
 # For tracking current user JWT Token Model
 class UserCurrentJWTToken(db.Model):
     __tablename__ = "user_current_jwt_token"
-    user_id = db.Column(db.String(40), primary_key=True, unique=True)
+    user_id = db.Column(PublicId, primary_key=True)
     jti = db.Column(db.String(40))
+    expires_at = db.Column(db.DateTime, nullable=True, index=True)
 
     def __repr__(self):
         return self.jti
 
 # Token Blocklist Model
 class TokenBlocklist(db.Model):
-    id = db.Column(db.String(40), primary_key=True, unique=True, default=generate_id)
+    id = db.Column(PublicId, primary_key=True, default=generate_id)
     jti = db.Column(db.String(40), nullable=False, index=True)
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=True, index=True)
 
     def __repr__(self):
         return self.jti
@@ -0,0 +1,70 @@
+from flask import g, has_app_context
+from flask_sqlalchemy import SQLAlchemy, SignallingSession, get_state
+from sqlalchemy import orm
+from sqlalchemy.sql import Select
+from functools import wraps
+import inspect
+
+# Bind key of the read replica in SQLALCHEMY_BINDS
+REPLICA = 'replica'
+
+
+# Session sending the SELECTs of read only resources to the replica
+class RoutingSession(SignallingSession):
+    """
+    Everything goes to the primary unless the resource is marked with use_replica, the statement is
+    a SELECT and this session has not written anything yet, so reads after a write see that write.
+    """
+
+    def __init__(self, db, **options):
+        super().__init__(db, **options)
+        self.has_written = False
+
+    def get_bind(self, mapper=None, clause=None):
+        if clause is None or not isinstance(clause, Select):
+            self.has_written = self.has_written or mapper is not None
+        elif not self.has_written and has_app_context() and g.get('use_replica') \
+                and REPLICA in (self.app.config.get('SQLALCHEMY_BINDS') or {}):
+            return get_state(self.app).db.get_engine(self.app, bind=REPLICA)
+
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+# Marking a resource method as read only, its queries may be served by the replica
+def use_replica(fn):
+    if inspect.iscoroutinefunction(fn):
+        @wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            g.use_replica = True
+            return await fn(*args, **kwargs)
+
+        return async_wrapper
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        g.use_replica = True
+        return fn(*args, **kwargs)
+
+    return wrapper
+
+
+# Copying the primary SQLite database onto the replica, a local stand-in for replication
+def sync_sqlite_replica(db) -> None:
+    primary = db.get_engine()
+    replica = db.get_engine(bind=REPLICA)
+
+    if primary.dialect.name != 'sqlite' or replica.dialect.name != 'sqlite':
+        raise ValueError('Only SQLite primary & replica can be synced locally')
+
+    source = primary.raw_connection()
+    target = replica.raw_connection()
+    try:
+        source.connection.backup(target.connection)
+    finally:
+        target.close()
+        source.close()
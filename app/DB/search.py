@@ -0,0 +1,186 @@
+from flask import current_app
+from sqlalchemy import event, text, literal, and_, or_
+from app import db
+from .models import Book, PublicId
+import re
+
+# Words usable in a full-text query
+term_pattern = re.compile(r'\w+', re.UNICODE)
+# Book columns covered by the full-text index
+indexed_columns = ('title', 'author', 'short_description', 'full_description')
+# Book id parameter of the raw statements, converted to the id storage like any ORM value
+book_id_param = db.bindparam('id', type_=PublicId)
+book_ids_param = db.bindparam('ids', type_=PublicId, expanding=True)
+
+
+def search_terms(value) -> list:
+    return term_pattern.findall((value or '').lower())
+
+
+# Base search backend
+class SearchBackend:
+    """
+    Full-text search over the book catalogue
+
+    search() returns a selectable with `book_id` and `rank` columns (lower rank is more relevant),
+    which the views join against the book table. Only the `q` argument goes through the backend, the
+    title & author filters stay substring matches on every backend.
+    """
+    name = None
+
+    def create_index(self, connection) -> bool:
+        return False
+
+    def rebuild(self, connection) -> None:
+        pass
+
+    def index_book(self, connection, book_id: str) -> None:
+        pass
+
+    def remove_book(self, connection, book_id: str) -> None:
+        pass
+
+    def index_books(self, connection, book_ids: list) -> None:
+        pass
+
+    def search(self, q=None):
+        raise NotImplementedError
+
+
+# Fallback backend for databases without a full-text index
+class LikeSearchBackend(SearchBackend):
+    name = 'like'
+
+    def search(self, q=None):
+        columns = (Book.title, Book.author, Book.short_description, Book.full_description)
+        filters = [or_(*[column.contains(term) for column in columns]) for term in search_terms(q)]
+
+        if not filters:
+            return None
+
+        return db.select(Book.id.label('book_id'), literal(0.0).label('rank')) \
+                 .where(and_(*filters)).subquery('book_match')
+
+
+# SQLite FTS5 backend, each index row holds the id of its book in an unindexed column
+class SQLiteFTS5Backend(SearchBackend):
+    name = 'sqlite_fts5'
+    table = 'book_fts'
+    columns = indexed_columns
+    # bm25 weight of each column, matches in the title count the most, book_id is never matched
+    weights = (10.0, 5.0, 2.0, 1.0)
+
+    def create_index(self, connection) -> bool:
+        """
+        Rows are joined on book.id, book rowids change on VACUUM & table rebuilds. An index from before
+        the book_id column keyed its rows on those rowids & is built again.
+        """
+        existing = [row[1] for row in connection.execute(text(f"PRAGMA table_info({self.table})"))]
+        if 'book_id' in existing:
+            return False
+        if existing:
+            connection.execute(text(f"DROP TABLE {self.table}"))
+
+        connection.execute(text(f"CREATE VIRTUAL TABLE {self.table} USING fts5({', '.join(self.columns)}, "
+                                f"book_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 2')"))
+        self.rebuild(connection)
+        return True
+
+    def rebuild(self, connection) -> None:
+        columns = ', '.join(self.columns)
+        connection.execute(text(f"DELETE FROM {self.table}"))
+        connection.execute(text(f"INSERT INTO {self.table} ({columns}, book_id) SELECT {columns}, id FROM book"))
+
+    def index_book(self, connection, book_id: str) -> None:
+        columns = ', '.join(self.columns)
+        self.remove_book(connection, book_id)
+        connection.execute(text(f"INSERT INTO {self.table} ({columns}, book_id) "
+                                f"SELECT {columns}, id FROM book WHERE id = :id").bindparams(book_id_param),
+                           {'id': book_id})
+
+    def remove_book(self, connection, book_id: str) -> None:
+        connection.execute(text(f"DELETE FROM {self.table} WHERE book_id = :id").bindparams(book_id_param),
+                           {'id': book_id})
+
+    def index_books(self, connection, book_ids: list) -> None:
+        """Indexing books just inserted by this transaction, book_ids are the ids it wrote"""
+        if not book_ids:
+            return
+
+        columns = ', '.join(self.columns)
+        connection.execute(text(f"INSERT INTO {self.table} ({columns}, book_id) SELECT {columns}, id FROM book "
+                                f"WHERE id IN :ids").bindparams(book_ids_param), {'ids': list(book_ids)})
+
+    @staticmethod
+    def match_expression(terms: list) -> str:
+        return ' AND '.join(f'"{term}"*' for term in terms)
+
+    def search(self, q=None):
+        terms = search_terms(q)
+        if not terms:
+            return None
+
+        weights = ', '.join(map(str, self.weights))
+        query = text(f"SELECT book.id AS book_id, bm25({self.table}, {weights}) AS rank FROM {self.table} "
+                     f"JOIN book ON book.id = {self.table}.book_id WHERE {self.table} MATCH :match")
+
+        return query.bindparams(match=self.match_expression(terms)).columns(book_id=PublicId, rank=db.Float) \
+                    .subquery('book_match')
+
+
+# Search extension, picks the backend from BOOK_SEARCH_BACKEND or from the database dialect
+class BookSearch:
+    backends = {LikeSearchBackend.name: LikeSearchBackend,
+                SQLiteFTS5Backend.name: SQLiteFTS5Backend}
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        name = app.config.get('BOOK_SEARCH_BACKEND')
+        if not name:
+            uri = app.config['SQLALCHEMY_DATABASE_URI']
+            name = SQLiteFTS5Backend.name if uri.startswith('sqlite') else LikeSearchBackend.name
+
+        app.extensions['book_search'] = self.backends[name]()
+
+    @classmethod
+    def register_backend(cls, backend) -> None:
+        cls.backends[backend.name] = backend
+
+    @property
+    def backend(self) -> SearchBackend:
+        return current_app.extensions['book_search']
+
+    def create_index(self) -> bool:
+        with db.engine.begin() as connection:
+            return self.backend.create_index(connection)
+
+    def rebuild(self) -> None:
+        with db.engine.begin() as connection:
+            self.backend.rebuild(connection)
+
+    def search(self, **kwargs):
+        return self.backend.search(**kwargs)
+
+
+book_search = BookSearch()
+
+
+# Keeping the index in sync with the book table, inside the same transaction
+@event.listens_for(Book, 'after_insert')
+def index_inserted_book(mapper, connection, target) -> None:
+    book_search.backend.index_book(connection, target.id)
+
+
+@event.listens_for(Book, 'after_update')
+def index_updated_book(mapper, connection, target) -> None:
+    state = db.inspect(target)
+    if any(state.attrs[column].history.has_changes() for column in indexed_columns):
+        book_search.backend.index_book(connection, target.id)
+
+
+@event.listens_for(Book, 'before_delete')
+def remove_deleted_book(mapper, connection, target) -> None:
+    book_search.backend.remove_book(connection, target.id)
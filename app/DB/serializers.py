@@ -1,5 +1,8 @@
 from app import mm
 from .models import User, Category, Book, History, BookReview
+from sqlalchemy import Date, DateTime
+from functools import lru_cache
+from operator import attrgetter
 
 
 # User Serializer
@@ -32,4 +35,59 @@ class HistorySerializer(mm.Schema):
 class BookReviewSerializer(mm.Schema):
     class Meta:
         model = BookReview
-        fields = ('id', 'rating', 'review', 'create_at')
\ No newline at end of file
+        fields = ('id', 'rating', 'review', 'create_at')
+
+
+# Schema restricted to an only= set & compiled to plain attribute reads, built once per schema & field set
+class CompiledSerializer:
+    """
+    Dumps ORM objects or Row tuples of the same columns like the marshmallow schema does, datetimes
+    as ISO strings & everything else as it is. Only column fields compile, properties need the schema.
+
+    columns are the model columns of the fields, to query rows holding nothing else.
+    """
+
+    def __init__(self, schema, only=None, many=False):
+        model = schema.Meta.model
+        column_attrs = model.__mapper__.column_attrs
+        self.fields = tuple(name for name in schema.Meta.fields if only is None or name in only)
+        self.many = many
+
+        unknown = [name for name in self.fields if name not in column_attrs] + \
+                  [name for name in only or () if name not in schema.Meta.fields]
+        if unknown:
+            raise ValueError(f"{schema.__name__} can not compile {', '.join(unknown)}")
+
+        self.columns = tuple(getattr(model, name) for name in self.fields)
+        self.datetimes = tuple(name for name in self.fields
+                               if isinstance(column_attrs[name].columns[0].type, (Date, DateTime)))
+        getter = attrgetter(*self.fields)
+        self.getter = getter if len(self.fields) > 1 else lambda obj: (getter(obj),)
+
+    def dump_one(self, obj) -> dict:
+        data = dict(zip(self.fields, self.getter(obj)))
+        for name in self.datetimes:
+            if data[name] is not None:
+                data[name] = data[name].isoformat()
+
+        return data
+
+    def dump(self, obj):
+        if not self.many:
+            return self.dump_one(obj)
+
+        if not self.datetimes:
+            fields, getter = self.fields, self.getter
+            return [dict(zip(fields, getter(item))) for item in obj]
+
+        return [self.dump_one(item) for item in obj]
+
+
+@lru_cache(maxsize=None)
+def _compile(schema, only, many) -> CompiledSerializer:
+    return CompiledSerializer(schema, only, many)
+
+
+# Compiled serializer of a schema, shared by every caller asking for the same only= set
+def compiled_serializer(schema, only=None, many=False) -> CompiledSerializer:
+    return _compile(schema, None if only is None else frozenset(only), many)
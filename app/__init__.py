@@ -1,35 +1,48 @@
 from flask import Flask, Blueprint
 from flask_restful import Api
-from flask_sqlalchemy import SQLAlchemy
 from flask_marshmallow import Marshmallow
-from flask_bcrypt import Bcrypt
 from flask_jwt_extended import JWTManager
-import datetime
+from .cache import RevocationCache, ResponseCache, TokenVersionCache, TTLCache, VersionedValue
+from .hashing import PasswordHasher
+from .config import config_by_name
+from .DB.routing import RoutingSQLAlchemy
+import os
 
 
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
 bp_api = Blueprint('api', __name__, url_prefix='/api')
 api = Api(bp_api)
 jwt = JWTManager()
-bcrypt = Bcrypt()
 mm = Marshmallow()
+revocation_cache = RevocationCache()
+response_cache = ResponseCache()
+token_versions = TokenVersionCache()
+password_hasher = PasswordHasher()
 
 
-def create_app() -> Flask:
+def create_app(config_name: str = None) -> Flask:
     app = Flask(__name__)
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///lms.db'
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    app.config['SECRET_KEY'] = 'faec6b0b19d8ce115edc970d2d38d96c'
-    app.config['JWT_SECRET_KEY'] = 'niec6b0b19d8ce115edc970d2d38d96m'
-    app.config['JWT_ACCESS_TOKEN_EXPIRES'] = datetime.timedelta(days=1)
+    app.config.from_object(config_by_name[config_name or os.environ.get('LMS_CONFIG', 'development')])
+
+    from .DB.engine import engine_options, configure_engine
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
 
     db.init_app(app)
+    with app.app_context():
+        configure_engine(db.engine, app.config)
+        for bind in app.config.get('SQLALCHEMY_BINDS') or {}:
+            configure_engine(db.get_engine(app, bind=bind), app.config)
     jwt.init_app(app)
-    bcrypt.init_app(app)
     mm.init_app(app)
+    revocation_cache.init_app(app)
+    response_cache.init_app(app)
+    token_versions.init_app(app)
+    password_hasher.init_app(app)
+    app.extensions['user_cache'] = TTLCache(app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TTL'])
+    app.extensions['category_list_cache'] = VersionedValue(os.path.join(app.instance_path, 'category_list.version'))
 
-    from .utils import create_db
-    create_db(app)
+    from .DB.search import book_search
+    book_search.init_app(app)
 
     from .API.urls import bp_user_auth, bp_user, bp_category, bp_book
     app.register_blueprint(bp_user_auth)
@@ -38,7 +51,8 @@ def create_app() -> Flask:
     app.register_blueprint(bp_book)
     app.register_blueprint(bp_api)
 
-    print("-------App created Successfully-------")
-    print("-------Tables created Successfully-------")
-    print("-------Admin created Successfully-------")
+    from .cli import lms_cli
+    app.cli.add_command(lms_cli)
+
+    app.logger.debug('App created with the %s config', config_name or os.environ.get('LMS_CONFIG', 'development'))
     return app
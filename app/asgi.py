@@ -0,0 +1,135 @@
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.exceptions import HTTPException, InternalServerError
+from app import create_app
+from app.DB.async_db import async_db
+from app.API.views.async_api import async_resources
+from app.API.representations import output_json
+from http import HTTPStatus
+import inspect
+import io
+import os
+import sys
+
+
+# WSGI environ of an ASGI http scope, without a body since only GETs are served async
+def build_environ(scope) -> dict:
+    script_name = scope.get('root_path', '').encode('utf8').decode('latin1')
+    path_info = scope['path'].encode('utf8').decode('latin1')
+    if path_info.startswith(script_name):
+        path_info = path_info[len(script_name):]
+
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {'REQUEST_METHOD': scope['method'],
+               'SCRIPT_NAME': script_name,
+               'PATH_INFO': path_info,
+               'QUERY_STRING': scope['query_string'].decode('ascii'),
+               'SERVER_NAME': server_name,
+               'SERVER_PORT': str(server_port),
+               'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+               'wsgi.version': (1, 0),
+               'wsgi.url_scheme': scope.get('scheme', 'http'),
+               'wsgi.input': io.BytesIO(),
+               'wsgi.errors': sys.stderr,
+               'wsgi.multithread': True,
+               'wsgi.multiprocess': True,
+               'wsgi.run_once': False}
+
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin1').upper().replace('-', '_')
+        if name not in ('CONTENT_LENGTH', 'CONTENT_TYPE'):
+            name = f'HTTP_{name}'
+        value = value.decode('latin1')
+        environ[name] = f'{environ[name]},{value}' if name in environ else value
+
+    return environ
+
+
+# ASGI application, GETs of the resources in async_resources run on the event loop, the rest on the WSGI app
+class AsyncDispatcher:
+    """
+    Routing, auth, the response cache & the JSON error bodies are those of the Flask app, the async
+    resources only swap the sync session for an async one.
+    """
+
+    def __init__(self, flask_app):
+        self.app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+
+        resource = None
+        if scope['type'] == 'http' and scope['method'] == 'GET':
+            environ = build_environ(scope)
+            resource, view_args = self.match(environ)
+
+        if resource is None:
+            return await self.wsgi(scope, receive, send)
+
+        response = await self.dispatch(environ, resource, view_args)
+        await send({'type': 'http.response.start',
+                    'status': response.status_code,
+                    'headers': [(name.lower().encode('latin1'), value.encode('latin1'))
+                                for name, value in response.headers.items()]})
+        await send({'type': 'http.response.body', 'body': response.get_data()})
+
+    def match(self, environ) -> tuple:
+        try:
+            rule, view_args = self.app.url_map.bind_to_environ(environ).match(return_rule=True)
+        except HTTPException:
+            return None, None
+
+        view_class = getattr(self.app.view_functions[rule.endpoint], 'view_class', None)
+        return async_resources.get(view_class), view_args
+
+    @staticmethod
+    def json_response(data, code, headers=None):
+        response = output_json(data, code, headers)
+        response.headers['Content-Type'] = 'application/json'
+        return response
+
+    def error_response(self, error: HTTPException):
+        # flask_restful's abort keeps the error body in data
+        data = getattr(error, 'data', None) or dict(message=error.description)
+        headers = [(name, value) for name, value in error.get_headers() if name.lower() != 'content-type']
+
+        return self.json_response(data, error.code, headers)
+
+    async def dispatch(self, environ, resource, view_args):
+        with self.app.request_context(environ):
+            try:
+                result = resource().get(**view_args)
+                if inspect.isawaitable(result):
+                    result = await result
+
+                if isinstance(result, self.app.response_class):
+                    response = result
+                else:
+                    response = self.json_response(result, HTTPStatus.OK)
+            except HTTPException as e:
+                response = self.error_response(e)
+            except Exception:
+                self.app.logger.exception('Exception on %s [GET]', environ['PATH_INFO'])
+                response = self.error_response(InternalServerError())
+
+            return self.app.process_response(response)
+
+    async def lifespan(self, receive, send) -> None:
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await async_db.dispose(self.app)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+# Runs the production profile unless LMS_CONFIG names another one, like app.wsgi
+app = create_app(os.environ.get('LMS_CONFIG', 'production'))
+async_db.init_app(app)
+application = AsyncDispatcher(app)
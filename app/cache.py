@@ -0,0 +1,399 @@
+from flask import current_app, request
+from flask_jwt_extended import get_jwt_identity
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+import datetime
+import inspect
+import os
+import threading
+import time
+import zlib
+
+
+# Version token shared by every process on the host through a file in the instance folder
+class SharedVersion:
+    def __init__(self, path: str):
+        self.path = path
+
+    def current(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+
+        return stat.st_ino, stat.st_mtime_ns
+
+    @staticmethod
+    def modified_at(version) -> datetime.datetime:
+        return datetime.datetime.fromtimestamp(version[1] / 1e9, tz=datetime.timezone.utc)
+
+    def bump(self) -> None:
+        temp_path = f'{self.path}.{os.getpid()}.{threading.get_ident()}'
+        with open(temp_path, 'w') as file:
+            file.write(str(time.time_ns()))
+        os.replace(temp_path, self.path)
+
+
+# Bounded, thread safe LRU mapping
+class LRUCache:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self.entries:
+                return default
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def set(self, key, value) -> None:
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def discard(self, key) -> None:
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def discard_if(self, predicate) -> None:
+        with self.lock:
+            for key in [key for key, value in self.entries.items() if predicate(value)]:
+                del self.entries[key]
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+
+# LRU whose entries expire after a fixed number of seconds
+class TTLCache(LRUCache):
+    def __init__(self, maxsize: int, ttl: float):
+        super().__init__(maxsize)
+        self.ttl = ttl
+
+    def get(self, key, default=None):
+        entry = super().get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return default
+
+        return entry[1]
+
+    def set(self, key, value) -> None:
+        super().set(key, (time.monotonic() + self.ttl, value))
+
+
+# Single value cached in process until any process bumps the shared version
+class VersionedValue:
+    def __init__(self, version_path: str):
+        self.version = SharedVersion(version_path)
+        if self.version.current() is None:
+            self.version.bump()
+        self.entry = None
+
+    def get(self, build):
+        """build(version) is called on a miss, the version is read before it touches the DB"""
+        version = self.version.current()
+        entry = self.entry
+
+        if entry is None or entry[0] != version:
+            entry = self.entry = (version, build(version))
+
+        return entry[1]
+
+    async def get_async(self, build):
+        """Same as get, for a coroutine build(version)"""
+        version = self.version.current()
+        entry = self.entry
+
+        if entry is None or entry[0] != version:
+            entry = self.entry = (version, await build(version))
+
+        return entry[1]
+
+    def invalidate(self) -> None:
+        """Call after the write is committed"""
+        self.version.bump()
+
+
+class _RevocationState:
+    def __init__(self, maxsize: int, version_path: str):
+        self.entries = LRUCache(maxsize)
+        self.version = SharedVersion(version_path)
+        self.seen_version = self.version.current()
+
+
+# In-process cache of JWT revocation lookups
+class RevocationCache:
+    """
+    Caches both revoked and not revoked answers per JTI.
+
+    Revocations never expire before the token does, so positive entries stay valid. Negative entries
+    are dropped whenever any process bumps the shared version after writing to the blocklist.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        app.config.setdefault('JWT_BLOCKLIST_CACHE_SIZE', 10000)
+        app.config.setdefault('JWT_BLOCKLIST_VERSION_FILE', os.path.join(app.instance_path, 'token_blocklist.version'))
+        version_path = app.config['JWT_BLOCKLIST_VERSION_FILE']
+        os.makedirs(os.path.dirname(version_path), exist_ok=True)
+
+        app.extensions['revocation_cache'] = _RevocationState(app.config['JWT_BLOCKLIST_CACHE_SIZE'], version_path)
+
+    @property
+    def state(self) -> _RevocationState:
+        return current_app.extensions['revocation_cache']
+
+    def is_revoked(self, jti: str, load) -> bool:
+        state = self.state
+        version = state.version.current()
+
+        if version != state.seen_version:
+            state.entries.discard_if(lambda revoked: not revoked)
+            state.seen_version = version
+
+        revoked = state.entries.get(jti)
+        if revoked is None:
+            revoked = load(jti)
+            state.entries.set(jti, revoked)
+
+        return revoked
+
+    def revoke(self, jti: str) -> None:
+        """Call after the blocklist row is committed"""
+        state = self.state
+        state.entries.set(jti, True)
+        state.version.bump()
+
+
+class _TokenVersionState:
+    def __init__(self, maxsize: int, version_path: str):
+        self.entries = LRUCache(maxsize)
+        self.version = SharedVersion(version_path)
+        self.seen_version = self.version.current()
+
+
+# In-process map of user id to the token version stored on the user row
+class TokenVersionCache:
+    """
+    Tokens carry the token version of their user at login & are rejected once the user's version moved on.
+
+    The whole map is dropped whenever any process bumps the shared version after changing a user's
+    version, so most requests are authorized without reading the user row.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        app.config.setdefault('JWT_TOKEN_VERSION_CACHE_SIZE', 10000)
+        app.config.setdefault('JWT_TOKEN_VERSION_FILE', os.path.join(app.instance_path, 'token_version.version'))
+        version_path = app.config['JWT_TOKEN_VERSION_FILE']
+        os.makedirs(os.path.dirname(version_path), exist_ok=True)
+
+        app.extensions['token_versions'] = _TokenVersionState(app.config['JWT_TOKEN_VERSION_CACHE_SIZE'],
+                                                               version_path)
+
+    @property
+    def state(self) -> _TokenVersionState:
+        return current_app.extensions['token_versions']
+
+    def current(self, user_id: str, load) -> int:
+        """load(user_id) is called on a miss & returns the stored version, -1 when the user is gone"""
+        state = self.state
+        version = state.version.current()
+
+        if version != state.seen_version:
+            state.entries.clear()
+            state.seen_version = version
+
+        current = state.entries.get(user_id)
+        if current is None:
+            current = load(user_id)
+            state.entries.set(user_id, current)
+
+        return current
+
+    def invalidate(self) -> None:
+        """Call after the new token version is committed"""
+        state = self.state
+        state.entries.clear()
+        state.version.bump()
+
+
+# Per tag versions, tags are hashed onto a fixed number of SharedVersion files
+class TagVersions:
+    def __init__(self, directory: str, buckets: int = 256):
+        os.makedirs(directory, exist_ok=True)
+        self.versions = [SharedVersion(os.path.join(directory, f'{bucket:03d}.version')) for bucket in range(buckets)]
+
+    def bucket(self, tag: str) -> SharedVersion:
+        return self.versions[zlib.crc32(tag.encode()) % len(self.versions)]
+
+    def current(self, tags) -> tuple:
+        return tuple(self.bucket(tag).current() for tag in tags)
+
+    def bump(self, tags) -> None:
+        for version in {self.bucket(tag) for tag in tags}:
+            version.bump()
+
+
+# Response cache backend, a shared cache only has to implement get, set & stats
+class CacheBackend:
+    name = None
+
+    def __init__(self, app):
+        pass
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl: float) -> None:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {}
+
+
+# In-process LRU backend with per entry TTL
+class MemoryCacheBackend(CacheBackend):
+    name = 'memory'
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.entries = LRUCache(app.config['RESPONSE_CACHE_SIZE'])
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+
+        return entry[1]
+
+    def set(self, key, value, ttl: float) -> None:
+        self.entries.set(key, (time.monotonic() + ttl, value))
+
+    def stats(self) -> dict:
+        return dict(size=len(self.entries.entries), evictions=self.entries.evictions)
+
+
+class _ResponseCacheState:
+    def __init__(self, backend: CacheBackend, tags: TagVersions, ttl: float):
+        self.backend = backend
+        self.tags = tags
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+
+# Cache for read heavy GET resources, invalidated by tag when the catalogue is written
+class ResponseCache:
+    """
+    Keys hold the endpoint, view args, role, normalized query args & optionally the user id.
+
+    Each entry remembers the versions of its tags when it was stored and is a miss once any of them
+    has been bumped, in this process or another one on the host.
+    """
+    backends = {MemoryCacheBackend.name: MemoryCacheBackend}
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        app.config.setdefault('RESPONSE_CACHE_BACKEND', MemoryCacheBackend.name)
+        app.config.setdefault('RESPONSE_CACHE_SIZE', 2048)
+        app.config.setdefault('RESPONSE_CACHE_TTL', 60)
+        app.config.setdefault('RESPONSE_CACHE_TAG_DIR', os.path.join(app.instance_path, 'cache_tags'))
+
+        backend = self.backends[app.config['RESPONSE_CACHE_BACKEND']](app)
+        tags = TagVersions(app.config['RESPONSE_CACHE_TAG_DIR'])
+        app.extensions['response_cache'] = _ResponseCacheState(backend, tags, app.config['RESPONSE_CACHE_TTL'])
+
+    @classmethod
+    def register_backend(cls, backend) -> None:
+        cls.backends[backend.name] = backend
+
+    @property
+    def state(self) -> _ResponseCacheState:
+        return current_app.extensions['response_cache']
+
+    @staticmethod
+    def make_key(view_args: dict, identity: dict, vary_on_user: bool) -> str:
+        query_args = urlencode(sorted(request.args.items(multi=True)))
+        user = identity['id'] if vary_on_user else ''
+
+        return f"{request.endpoint}|{urlencode(sorted(view_args.items()))}|{identity['role']}|{user}|{query_args}"
+
+    def cached(self, tags, vary_on_user=None):
+        """
+        Caching the dict returned by a resource method, use under the auth decorator
+
+        :param tags: list of tags, or a callable taking the view args
+        :param vary_on_user: callable taking the JWT identity, True when the response is user specific
+        """
+        def lookup(kwargs) -> tuple:
+            state = self.state
+            identity = get_jwt_identity()
+            key = self.make_key(kwargs, identity, bool(vary_on_user and vary_on_user(identity)))
+            versions = state.tags.current(tags(**kwargs) if callable(tags) else tags)
+
+            entry = state.backend.get(key)
+            if entry is not None and entry[0] == versions:
+                state.hits += 1
+                return key, versions, entry
+
+            state.misses += 1
+            return key, versions, None
+
+        def store(key, versions, result) -> None:
+            # Only plain successful responses are stored, errors abort before reaching here
+            if isinstance(result, dict):
+                self.state.backend.set(key, (versions, result), self.state.ttl)
+
+        def decorator(fn):
+            if inspect.iscoroutinefunction(fn):
+                @wraps(fn)
+                async def async_wrapper(*args, **kwargs):
+                    key, versions, entry = lookup(kwargs)
+                    if entry is not None:
+                        return entry[1]
+
+                    result = await fn(*args, **kwargs)
+                    store(key, versions, result)
+                    return result
+
+                return async_wrapper
+
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                key, versions, entry = lookup(kwargs)
+                if entry is not None:
+                    return entry[1]
+
+                result = fn(*args, **kwargs)
+                store(key, versions, result)
+                return result
+
+            return wrapper
+
+        return decorator
+
+    def invalidate(self, *tags) -> None:
+        """Call after the write is committed"""
+        self.state.tags.bump(tags)
+
+    def stats(self) -> dict:
+        state = self.state
+        return dict(state.backend.stats(), hits=state.hits, misses=state.misses)
@@ -0,0 +1,146 @@
+from flask.cli import AppGroup
+from .utils import sweep_expired_tokens, migrate_borrowed_books, seed_admin
+from .DB import migrations
+from .DB.audit import audit_queries
+from .DB.book_import import import_books, CSV, NDJSON
+from .DB.models import User
+from .DB.routing import sync_sqlite_replica
+from . import db
+import click
+import time
+
+lms_cli = AppGroup('lms', help='Library management maintenance commands')
+
+
+@lms_cli.command('db-upgrade')
+def db_upgrade() -> None:
+    """
+    Apply the pending schema migrations, with the time taken by each step
+    """
+    applied = migrations.upgrade(log=click.echo)
+
+    click.echo(f"Applied {len(applied)} migrations" if applied else "Database is up to date")
+
+
+# Kept for existing deploy scripts, a fresh database is created by the baseline migration
+lms_cli.add_command(db_upgrade, 'init-db')
+
+
+@lms_cli.command('rebuild-tables')
+def rebuild_tables() -> None:
+    """
+    Rebuild the tables whose primary key or id storage differ from the models, e.g. after changing LMS_ID_STORAGE
+    """
+    rebuilt = migrations.rebuild_tables(log=click.echo)
+
+    click.echo(f"Rebuilt {len(rebuilt)} tables")
+
+
+@lms_cli.command('db-status')
+def db_status() -> None:
+    """
+    List the schema migrations & when each one was applied
+    """
+    for step, applied in migrations.status():
+        state = f"applied {applied.applied_at:%Y-%m-%d %H:%M:%S} ({applied.duration_ms}ms)" if applied else 'pending'
+        click.echo(f"{step.version:03d} {step.description}: {state}")
+
+
+@lms_cli.command('seed-admin')
+@click.option('--username', default='admin', show_default=True)
+@click.option('--email', default='admin@gmail.com', show_default=True)
+@click.option('--password', default='1234', envvar='LMS_ADMIN_PASSWORD', help='Defaults to $LMS_ADMIN_PASSWORD or 1234')
+def seed_admin_user(username: str, email: str, password: str) -> None:
+    """
+    Create the Admin user if it does not exist yet
+    """
+    if seed_admin(username, email, password):
+        click.echo(f"Admin {username} created")
+    else:
+        click.echo(f"Admin {username} already exists")
+
+
+@lms_cli.command('sweep-tokens')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows deleted per transaction')
+def sweep_tokens(batch_size: int) -> None:
+    """
+    Delete expired rows from the JWT blocklist & current token tables
+    """
+    result = sweep_expired_tokens(batch_size=batch_size)
+    reclaimed = 'unknown' if result['bytes'] is None else f"{result['bytes']} bytes"
+
+    click.echo(f"Deleted {result['rows']} expired token rows, reclaimed {reclaimed}")
+
+
+@lms_cli.command('migrate-loans')
+def migrate_loans() -> None:
+    """
+    Move the legacy JSON book_borrowed lists into the loan table
+    """
+    migrated = migrate_borrowed_books()
+
+    click.echo(f"Migrated {migrated} borrowed books into loans")
+
+
+@lms_cli.command('sync-replica')
+@click.option('--interval', default=0.0, show_default=True, help='Seconds between copies, 0 copies once')
+def sync_replica(interval: float) -> None:
+    """
+    Copy the primary SQLite database onto the replica
+    """
+    while True:
+        started = time.perf_counter()
+        sync_sqlite_replica(db)
+        click.echo(f"Replica synced in {time.perf_counter() - started:.3f}s")
+
+        if not interval:
+            break
+        time.sleep(interval)
+
+
+@lms_cli.command('audit-queries')
+@click.option('--verbose', is_flag=True, help='Print the plan of every query, not only the flagged ones')
+def audit_endpoint_queries(verbose: bool) -> None:
+    """
+    EXPLAIN the endpoint queries & flag full table scans, exits with 1 when any is found
+    """
+    scans = 0
+
+    for name, plan, full_scans, sorts in audit_queries():
+        scans += bool(full_scans)
+        marker = 'SCAN' if full_scans else 'SORT' if sorts else 'ok'
+        click.echo(f"{marker:<5}{name}")
+
+        if verbose or full_scans or sorts:
+            for line in plan:
+                click.echo(f"       {line}")
+
+    click.echo(f"{scans} queries read a whole table")
+    if scans:
+        raise SystemExit(1)
+
+
+@lms_cli.command('import-books')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice([CSV, NDJSON]), help='Defaults to csv for .csv files, else ndjson')
+@click.option('--batch-size', default=5000, show_default=True, help='Rows inserted per transaction')
+@click.option('--create-categories', is_flag=True, help='Create the categories which do not exist yet')
+@click.option('--username', default='admin', show_default=True, help='User recorded as having added the books')
+def import_books_file(path: str, fmt: str, batch_size: int, create_categories: bool, username: str) -> None:
+    """
+    Import books from a CSV or JSON-lines file
+    """
+    user_id = db.session.query(User.id).filter_by(username=username).scalar()
+    if user_id is None:
+        raise click.BadParameter(f"No user named {username}", param_hint='--username')
+
+    started = time.perf_counter()
+    with open(path, encoding='utf-8', newline='') as stream:
+        report = import_books(stream, fmt or (CSV if path.endswith('.csv') else NDJSON), user_id,
+                              batch_size=batch_size, create_categories=create_categories)
+    elapsed = time.perf_counter() - started
+
+    for error in report['errors']:
+        click.echo(f"line {error['line']}: {error['error']}", err=True)
+    click.echo(f"Imported {report['imported']} books ({report['imported'] / elapsed:.0f}/s), "
+               f"rejected {report['failed']}, created {report['created_categories']} categories")
@@ -0,0 +1,70 @@
+import datetime
+import os
+
+
+def env_int(name: str, default):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, '') else default
+
+
+# Default profile, the engine is left on SQLAlchemy's defaults
+class Config:
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///lms.db')
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Read replica for the list endpoints, synced by `flask lms sync-replica` when both are SQLite
+    SQLALCHEMY_BINDS = {'replica': os.environ['DATABASE_REPLICA_URL']} if os.environ.get('DATABASE_REPLICA_URL') else None
+    SECRET_KEY = os.environ.get('SECRET_KEY', 'faec6b0b19d8ce115edc970d2d38d96c')
+    JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'niec6b0b19d8ce115edc970d2d38d96m')
+    JWT_ACCESS_TOKEN_EXPIRES = datetime.timedelta(days=1)
+    # Bcrypt cost, logins rehash passwords stored with another cost
+    BCRYPT_LOG_ROUNDS = env_int('BCRYPT_LOG_ROUNDS', 12)
+    # Bcrypt runs on this many threads with at most PASSWORD_HASH_QUEUE_SIZE waiting, None sizes by the cores
+    PASSWORD_HASH_WORKERS = env_int('PASSWORD_HASH_WORKERS', None)
+    PASSWORD_HASH_QUEUE_SIZE = env_int('PASSWORD_HASH_QUEUE_SIZE', None)
+    LOAN_PERIOD = datetime.timedelta(days=14)
+
+    # Seconds a user row may be reused across requests of this process, 0 disables it
+    USER_CACHE_TTL = env_int('USER_CACHE_TTL', 0)
+    USER_CACHE_SIZE = 1024
+
+    # Connection pool, None keeps the SQLAlchemy default
+    DB_POOL_SIZE = env_int('DB_POOL_SIZE', None)
+    DB_MAX_OVERFLOW = env_int('DB_MAX_OVERFLOW', None)
+    DB_POOL_RECYCLE = env_int('DB_POOL_RECYCLE', None)
+    DB_POOL_TIMEOUT = env_int('DB_POOL_TIMEOUT', None)
+    DB_POOL_PRE_PING = False
+
+    # SQLite connection pragmas, None leaves the SQLite default
+    SQLITE_JOURNAL_MODE = None
+    SQLITE_SYNCHRONOUS = None
+    SQLITE_BUSY_TIMEOUT = None
+    SQLITE_MMAP_SIZE = None
+
+
+class DevelopmentConfig(Config):
+    DEBUG = True
+
+
+class TestingConfig(Config):
+    TESTING = True
+    BCRYPT_LOG_ROUNDS = env_int('BCRYPT_LOG_ROUNDS', 4)
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite://')
+
+
+# Tuned for concurrent traffic, every value can still be overridden from the environment
+class ProductionConfig(Config):
+    DB_POOL_SIZE = env_int('DB_POOL_SIZE', 10)
+    DB_MAX_OVERFLOW = env_int('DB_MAX_OVERFLOW', 20)
+    DB_POOL_RECYCLE = env_int('DB_POOL_RECYCLE', 1800)
+    DB_POOL_TIMEOUT = env_int('DB_POOL_TIMEOUT', 30)
+    DB_POOL_PRE_PING = True
+
+    SQLITE_JOURNAL_MODE = 'WAL'
+    SQLITE_SYNCHRONOUS = 'NORMAL'
+    SQLITE_BUSY_TIMEOUT = env_int('SQLITE_BUSY_TIMEOUT', 5000)
+    SQLITE_MMAP_SIZE = env_int('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)
+
+
+config_by_name = dict(development=DevelopmentConfig,
+                      testing=TestingConfig,
+                      production=ProductionConfig)
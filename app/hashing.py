@@ -0,0 +1,82 @@
+from flask import current_app
+from werkzeug.exceptions import ServiceUnavailable
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+import os
+import threading
+
+
+class _HasherState:
+    def __init__(self, workers: int, queue_size: int, rounds: int):
+        self.workers = workers
+        self.rounds = rounds
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+        self.lock = threading.Lock()
+        self.executor = None
+        self.pid = None
+
+    def get_executor(self) -> ThreadPoolExecutor:
+        # Created on first use & again in a forked child, whose copy has no running threads
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix='bcrypt')
+                    self.pid = os.getpid()
+
+        return self.executor
+
+
+# Bcrypt hashing on a bounded pool of threads, bcrypt releases the GIL while it works
+class PasswordHasher:
+    """
+    At most PASSWORD_HASH_WORKERS hashes run at once & PASSWORD_HASH_QUEUE_SIZE more may wait. Beyond that
+    the request fails fast with 503 instead of piling up behind the CPU bound work.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app) -> None:
+        workers = app.config.get('PASSWORD_HASH_WORKERS') or os.cpu_count() or 1
+        queue_size = app.config.get('PASSWORD_HASH_QUEUE_SIZE')
+        queue_size = workers * 4 if queue_size is None else queue_size
+
+        app.extensions['password_hasher'] = _HasherState(workers, queue_size, app.config.get('BCRYPT_LOG_ROUNDS', 12))
+
+    @property
+    def state(self) -> _HasherState:
+        return current_app.extensions['password_hasher']
+
+    def run(self, fn, *args):
+        state = self.state
+        if not state.slots.acquire(blocking=False):
+            error = ServiceUnavailable(retry_after=1)
+            error.data = dict(error='Server is busy, Please try again', status='SERVICE_UNAVAILABLE')
+            raise error
+
+        try:
+            future = state.get_executor().submit(fn, *args)
+        except BaseException:
+            state.slots.release()
+            raise
+
+        future.add_done_callback(lambda _: state.slots.release())
+        return future.result()
+
+    def generate(self, password: str) -> str:
+        if not password:
+            raise ValueError('Password must be non-empty.')
+
+        salt = bcrypt.gensalt(self.state.rounds)
+        return self.run(bcrypt.hashpw, password.encode('utf8'), salt).decode('utf8')
+
+    def check(self, password_hash: str, password: str) -> bool:
+        return self.run(bcrypt.checkpw, password.encode('utf8'), password_hash.encode('utf8'))
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """True when the hash was made with another cost than BCRYPT_LOG_ROUNDS, e.g. $2b$12$..."""
+        try:
+            return int(password_hash.split('$')[2]) != self.state.rounds
+        except (AttributeError, IndexError, ValueError):
+            return True
@@ -1,20 +1,56 @@
+from flask import current_app, g
 from flask_restful import abort
-from .DB.models import db, User, History, TokenBlocklist
+from .DB.models import db, User, Book, History, Loan, TokenBlocklist, UserCurrentJWTToken, PublicId
 from http import HTTPStatus
-from app import jwt
+from app import jwt, revocation_cache, response_cache, token_versions
 from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
 from flask_jwt_extended.exceptions import JWTExtendedException
 from jwt import PyJWTError
+from sqlalchemy import and_, or_, text, event
+from sqlalchemy.orm import make_transient_to_detached
 from functools import wraps
 from typing import Dict, Union
+import asyncio
+import base64
+import contextvars
+import datetime
+import inspect
+import json
+import time
 
 
 # For success response
 def success_response(data=None, code=None, msg=None, status=None):
     return dict(code=code, message=msg, data=data, status=status)
 
-# General Auth check
+# Calling fn on the default executor in a copy of the current context, keeping its sync DB lookups off the event loop
+async def run_off_loop(fn, *args):
+    """The worker thread gets a scoped session of its own, removed once fn returns"""
+    def call():
+        try:
+            return fn(*args)
+        finally:
+            db.session.remove()
+
+    return await asyncio.get_running_loop().run_in_executor(None, contextvars.copy_context().run, call)
+
+# General Auth check, coroutine views verify the token on a worker thread
 def auth_required(fn):
+    if inspect.iscoroutinefunction(fn):
+        @wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            try:
+                # The blocklist & token version loaders read the sync session on a miss
+                await run_off_loop(verify_jwt_in_request)
+            except (JWTExtendedException, PyJWTError):
+                abort(HTTPStatus.UNAUTHORIZED,
+                      error='Login required',
+                      status='UNAUTHORIZED')
+
+            return await fn(*args, **kwargs)
+
+        return async_wrapper
+
     @wraps(fn)
     def wrapper(*args, **kwargs):
         try:
@@ -69,19 +105,115 @@ def librarian_access(fn):
 
     return wrapper
 
+# User row for the id, through the short lived process cache when USER_CACHE_TTL is set
+def load_user(_id) -> User:
+    if not current_app.config['USER_CACHE_TTL']:
+        return User.get_by_id(_id)
+
+    user_cache = current_app.extensions['user_cache']
+    values = user_cache.get(_id)
+
+    if values is None:
+        user = User.get_by_id(_id)
+        user_cache.set(_id, {column.key: getattr(user, column.key) for column in User.__mapper__.column_attrs})
+        return user
+
+    user = User(**values)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+# Current user of the request, loaded at most once per request
+def load_current_user() -> User:
+    if 'current_user' not in g:
+        g.current_user = load_user(get_jwt_identity()['id'])
+
+    return g.current_user
+
+# User by id, reusing the current user when it is the same one
+def get_user(_id) -> User:
+    current_user = load_current_user()
+
+    return current_user if current_user.id == _id else User.get_by_id(_id)
+
+# Dropping cached user rows on every write
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def invalidate_cached_user(mapper, connection, target) -> None:
+    current_app.extensions['user_cache'].discard(target.id)
+
 # Checking Public or not
 @librarian_access
 def is_public():
     pass
 
-# Checking for JWT token in blocklist
-@jwt.token_in_blocklist_loader
-def check_if_token_revoked(jwt_header, jwt_payload: dict) -> bool:
-    jti = jwt_payload["jti"]
+# Blocklist lookup in the DB
+def token_in_blocklist(jti: str) -> bool:
     token = db.session.query(TokenBlocklist.id).filter_by(jti=jti).scalar()
 
     return token is not None
 
+# Stored token version of a user, -1 once the user is deleted
+def user_token_version(_id: str) -> int:
+    user = db.session.query(User.token_version).filter_by(id=_id).first()
+
+    return -1 if user is None else user.token_version or 0
+
+# JWT_DECODE_LEEWAY in seconds
+def jwt_leeway() -> float:
+    leeway = current_app.config.get('JWT_DECODE_LEEWAY', 0)
+    return leeway.total_seconds() if isinstance(leeway, datetime.timedelta) else leeway
+
+# Checking for JWT token in blocklist, through the in-process revocation cache
+@jwt.token_in_blocklist_loader
+def check_if_token_revoked(jwt_header, jwt_payload: dict) -> bool:
+    # Expired tokens are rejected without a lookup, their blocklist rows may already be swept
+    if 'exp' in jwt_payload and jwt_payload['exp'] < time.time() - jwt_leeway():
+        return True
+
+    # Deactivation, role change & delete bump the user's version, the role & active claims are then stale
+    identity = jwt_payload.get(current_app.config['JWT_IDENTITY_CLAIM'])
+    if isinstance(identity, dict) and \
+            identity.get('ver', 0) != token_versions.current(identity['id'], load=user_token_version):
+        return True
+
+    return revocation_cache.is_revoked(jwt_payload["jti"], load=token_in_blocklist)
+
+# Free space inside the database file, in bytes
+def database_free_bytes() -> Union[int, None]:
+    if db.engine.dialect.name != 'sqlite':
+        return None
+
+    page_size = db.session.execute(text('PRAGMA page_size')).scalar()
+    return db.session.execute(text('PRAGMA freelist_count')).scalar() * page_size
+
+# Deleting expired tokens from TokenBlocklist & UserCurrentJWTToken in batches
+def sweep_expired_tokens(batch_size: int = 1000) -> Dict[str, Union[int, None]]:
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=jwt_leeway())
+    expired_filters = [(TokenBlocklist.id, TokenBlocklist.expires_at < cutoff),
+                       (UserCurrentJWTToken.user_id, UserCurrentJWTToken.expires_at < cutoff)]
+
+    # Rows written before expires_at was stored only have their creation time
+    token_lifetime = current_app.config['JWT_ACCESS_TOKEN_EXPIRES']
+    if isinstance(token_lifetime, datetime.timedelta):
+        expired_filters.append((TokenBlocklist.id, TokenBlocklist.expires_at.is_(None) &
+                                (TokenBlocklist.created_at < cutoff - token_lifetime)))
+
+    free_bytes = database_free_bytes()
+    rows = 0
+
+    for key, expired in expired_filters:
+        while True:
+            batch = db.session.query(key).filter(expired).limit(batch_size)
+            deleted = db.session.query(key.class_).filter(key.in_(batch)).delete(synchronize_session=False)
+            db.session.commit()
+            rows += deleted
+
+            if deleted < batch_size:
+                break
+
+    reclaimed = database_free_bytes()
+    return dict(rows=rows, bytes=None if free_bytes is None else reclaimed - free_bytes)
+
 # Common DB summit
 def user_summit(data, code=HTTPStatus.OK, msg='Done', check_existing=True):
     try:
@@ -103,6 +235,7 @@ def category_summit(data, code, msg):
     try:
         db.session.add(data)
         db.session.commit()
+        response_cache.invalidate('categories', f'category:{data.id}')
 
     except Exception as e:
         if 'category.name' in str(e):
@@ -119,6 +252,7 @@ def book_summit(data, code, msg):
     try:
         db.session.add(data)
         db.session.commit()
+        response_cache.invalidate('books', f'book:{data.id}')
 
     except Exception as e:
         if 'book.title' in str(e):
@@ -130,6 +264,66 @@ def book_summit(data, code, msg):
                             msg=msg,
                             status='OK'), code
 
+# Opaque cursor holding the sort key of the last row of a page
+def encode_cursor(values) -> str:
+    values = [value.isoformat() if isinstance(value, datetime.datetime) else value for value in values]
+    cursor = base64.urlsafe_b64encode(json.dumps(values, separators=(',', ':')).encode())
+    return cursor.decode().rstrip('=')
+
+# Reading a cursor back into sort key values
+def decode_cursor(cursor: str, keys) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(keys):
+            raise ValueError(cursor)
+
+        # Values are bound against the sort columns, anything but a JSON scalar of the column's kind is refused
+        decoded = []
+        for (column, _), value in zip(keys, values):
+            if isinstance(column.type, db.DateTime):
+                if not isinstance(value, str):
+                    raise TypeError(value)
+                value = datetime.datetime.fromisoformat(value)
+            elif isinstance(value, bool) or not isinstance(value, (str, int, float)):
+                raise TypeError(value)
+            decoded.append(value)
+
+        return decoded
+    except (ValueError, TypeError):
+        abort(HTTPStatus.BAD_REQUEST,
+              error='Invalid cursor',
+              status='BAD_REQUEST')
+
+# Filters & order of the page after a cursor, keys are (column, descending) pairs ending with a unique column
+def cursor_clauses(keys, cursor: str) -> tuple:
+    filters = []
+
+    if cursor:
+        values = decode_cursor(cursor, keys)
+        after = []
+        for position, (column, descending) in enumerate(keys):
+            equal = [keys[i][0] == values[i] for i in range(position)]
+            after.append(and_(*equal, column < values[position] if descending else column > values[position]))
+        filters.append(or_(*after))
+
+    return filters, [column.desc() if descending else column for column, descending in keys]
+
+# Trimming the per_page + 1 rows read for a cursor page, with the cursor of the next page
+def cursor_page(items: list, keys, per_page: int) -> tuple:
+    if len(items) <= per_page:
+        return items, None
+
+    items = items[:per_page]
+    return items, encode_cursor([getattr(items[-1], column.key) for column, _ in keys])
+
+# Keyset (cursor) pagination, keys are (column, descending) pairs ending with a unique column
+def cursor_paginate(query, keys, cursor: str, per_page: int, with_total=False):
+    total = query.order_by(None).count() if with_total else None
+    filters, order = cursor_clauses(keys, cursor)
+    items, next_cursor = cursor_page(query.filter(*filters).order_by(*order).limit(per_page + 1).all(), keys, per_page)
+
+    return items, dict(next_cursor=next_cursor, total=total)
+
 # Checking if a user can review a book ot not
 def can_review(user_id: str, book_id: str) -> bool:
     history = History.query.filter_by(user_id=user_id, book_id=book_id).first()
@@ -137,11 +331,54 @@ def can_review(user_id: str, book_id: str) -> bool:
         return True
     return False
 
-# Initial creation of all Tables & Admin user
-def create_db(app) -> None:
-    with app.app_context():
-        db.create_all()
+# Legacy tables as migration 3 reads them, ids stay untyped since they are still text until migration 7
+legacy_user = db.table('user', db.column('id'), db.column('book_borrowed'))
+legacy_book = db.table('book', db.column('id'))
+legacy_history = db.table('history', db.column('user_id'), db.column('book_id'), db.column('date', db.DateTime),
+                          db.column('type'))
+
+# Moving the legacy JSON book_borrowed lists into Loan rows
+def migrate_borrowed_books() -> int:
+    """
+    Only the legacy columns are read, later migrations add columns the ORM User would load & may
+    change how ids are stored. Loan is created by the baseline migration in the configured storage.
+    """
+    loan_period = current_app.config['LOAN_PERIOD']
+    to_string = PublicId().process_result_value
+    users = db.session.execute(db.select(legacy_user.c.id, legacy_user.c.book_borrowed)
+                                 .where(legacy_user.c.book_borrowed.isnot(None),
+                                        legacy_user.c.book_borrowed.notin_(['', '[]']))).all()
+    migrated = 0
+
+    for raw_user_id, borrowed_json in users:
+        user_id = to_string(raw_user_id, None)
+        for book_id in json.loads(borrowed_json):
+            if Loan.get_active(user_id, book_id) or \
+                    not db.session.execute(db.select(legacy_book.c.id).where(legacy_book.c.id == book_id)).first():
+                continue
+
+            borrowed_at = db.session.execute(db.select(db.func.max(legacy_history.c.date))
+                                               .where(legacy_history.c.user_id == raw_user_id,
+                                                      legacy_history.c.book_id == book_id,
+                                                      legacy_history.c.type == History.borrow_book)) \
+                                    .scalar() or datetime.datetime.utcnow()
+            db.session.add(Loan(user_id=user_id, book_id=book_id, borrowed_at=borrowed_at,
+                                due_at=borrowed_at + loan_period))
+            migrated += 1
+
+    if users:
+        db.session.execute(legacy_user.update().where(legacy_user.c.id.in_([user_id for user_id, _ in users]))
+                                               .values(book_borrowed='[]'))
+
+    db.session.commit()
+    return migrated
+
+# Creation of the Admin user, skipped when the username or email is taken
+def seed_admin(username: str, email: str, password: str) -> bool:
+    if db.session.query(User.id).filter(or_(User.username == username, User.email == email)).first():
+        return False
 
-        admin_user: User = User(username='admin', email='admin@gmail.com', first_name="admin", last_name='',
-                                password='1234', user_type=User.Admin)
-        user_summit(admin_user, check_existing=False)
+    db.session.add(User(username=username, email=email, first_name=username, last_name='',
+                        password=password, user_type=User.Admin))
+    db.session.commit()
+    return True
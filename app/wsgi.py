@@ -0,0 +1,6 @@
+from app import create_app
+import os
+
+# WSGI entry point for production servers, see gunicorn.conf.py
+# Runs the production profile unless LMS_CONFIG names another one
+app = create_app(os.environ.get('LMS_CONFIG', 'production'))
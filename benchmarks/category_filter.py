@@ -0,0 +1,70 @@
+# Book list filtered by category: the release's IN list of lazy loaded ids against the EXISTS subquery
+from app import db
+from app.API.views.book_api import book_list_filters, book_list_serializer
+from app.DB.models import User, Book, Category, category_book, generate_id
+from .common import bench_app, measure, count_statements, report
+import argparse
+
+
+def seed(books: int, categories: int) -> list:
+    admin_id = db.session.query(User.id).filter_by(username='admin').scalar()
+    category_ids = [generate_id() for _ in range(categories)]
+    db.session.execute(Category.__table__.insert(), [dict(id=_id, name=f'category {number}', user_id=admin_id)
+                                                     for number, _id in enumerate(category_ids)])
+
+    rows, links = [], []
+    for number in range(books):
+        book_id = generate_id()
+        rows.append(dict(id=book_id, title=f'book {number:06d}', author='author', short_description='short',
+                         full_description='full', count=number % 4, user_id=admin_id))
+        # Half of the catalogue is in the first category, the rest spread over the others
+        category = 0 if number % 2 else 1 + number % (categories - 1)
+        links.append(dict(book_id=book_id, category_id=category_ids[category]))
+
+    db.session.execute(Book.__table__.insert(), rows)
+    db.session.execute(category_book.insert(), links)
+    db.session.commit()
+    return category_ids
+
+
+def before(category_id: str):
+    # BookCreateListAPI.get up to the category filter change
+    categories = Category.query.filter(Category.id.in_([category_id])).all()
+    book_ids = set()
+    for category in categories:
+        book_ids.update([book.id for book in category.books])
+
+    page = Book.query.filter(Book.count.isnot(0), Book.id.in_(book_ids)).order_by(Book.title) \
+                     .paginate(page=1, per_page=10, error_out=False)
+    db.session.remove()
+    return page.total
+
+
+def after(category_id: str):
+    filters, _ = book_list_filters({'category': category_id}, {'role': User.Public, 'id': ''})
+    page = Book.query.with_entities(*book_list_serializer.columns).filter(*filters).order_by(Book.title) \
+                     .paginate(page=1, per_page=10, error_out=False)
+    db.session.remove()
+    return page.total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--books', type=int, default=20000)
+    parser.add_argument('--categories', type=int, default=20)
+    args = parser.parse_args()
+
+    app = bench_app()
+    with app.app_context():
+        category_ids = seed(args.books, args.categories)
+        assert before(category_ids[0]) == after(category_ids[0])
+        print(f'{args.books} books, {args.books // 2} in the filtered category')
+
+        for name, fn in (('before (IN list)', before), ('after (EXISTS)', after)):
+            with count_statements() as statements:
+                fn(category_ids[0])
+            report(name, measure(lambda: fn(category_ids[0]), repeat=20), len(statements))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+# Shared setup of the benchmark scripts, run them from the project root, e.g. `python -m benchmarks.category_filter`
+from contextlib import contextmanager
+from sqlalchemy import event
+from app import create_app, db
+from app.config import config_by_name
+from app.DB.migrations import upgrade
+from app.utils import seed_admin
+import statistics
+import tempfile
+import time
+import os
+
+
+# App of the profile on a fresh SQLite file, migrated & with the admin user
+def bench_app(profile: str = 'testing', path: str = None):
+    path = path or os.path.join(tempfile.mkdtemp(prefix='lms-bench-'), 'lms.db')
+    config_by_name[profile].SQLALCHEMY_DATABASE_URI = f'sqlite:///{path}'
+
+    app = create_app(profile)
+    with app.app_context():
+        upgrade(log=lambda message: None)
+        seed_admin('admin', 'admin@example.com', 'admin')
+
+    return app
+
+
+# Median & 95th percentile of fn in milliseconds, after a warm up call
+def measure(fn, repeat: int = 50) -> dict:
+    fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+
+    samples.sort()
+    return dict(median=statistics.median(samples), p95=samples[int(len(samples) * 0.95) - 1])
+
+
+# Statements sent to the database while the block runs
+@contextmanager
+def count_statements():
+    statements = []
+
+    def record(connection, cursor, statement, parameters, context, executemany) -> None:
+        statements.append(statement)
+
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+
+def report(name: str, timing: dict, statements: int = None) -> None:
+    queries = f', {statements} statements' if statements is not None else ''
+    print(f"{name:<28} median {timing['median']:8.2f}ms  p95 {timing['p95']:8.2f}ms{queries}")
@@ -0,0 +1,91 @@
+# My books page: the release's per book review lookup against the single joined query
+from app import db
+from app.API.views.book_api import my_book_serializer, review_serializer
+from app.DB.models import User, Book, BookReview, Loan, generate_id
+from app.DB.serializers import BookSerializer, BookReviewSerializer
+from .common import bench_app, measure, count_statements, report
+import argparse
+import datetime
+
+
+def seed(loans: int, reviews: int) -> str:
+    user = User(username='reader', email='reader@example.com', first_name='reader', last_name='', password='secret',
+                user_type=User.Public)
+    db.session.add(user)
+    db.session.flush()
+
+    book_ids = [generate_id() for _ in range(max(loans, reviews))]
+    now = datetime.datetime.utcnow()
+    db.session.execute(Book.__table__.insert(), [dict(id=_id, title=f'book {number:06d}', author='author', count=1)
+                                                 for number, _id in enumerate(book_ids)])
+    db.session.execute(Loan.__table__.insert(), [dict(id=generate_id(), user_id=user.id, book_id=_id,
+                                                      borrowed_at=now - datetime.timedelta(minutes=number),
+                                                      due_at=now + datetime.timedelta(days=14))
+                                                 for number, _id in enumerate(book_ids[:loans])])
+    db.session.execute(BookReview.__table__.insert(), [dict(id=generate_id(), user_id=user.id, book_id=_id, rating=4,
+                                                            review='good', create_at=now)
+                                                       for _id in book_ids[-reviews:]])
+    db.session.commit()
+    return user.id
+
+
+def before(user_id: str, per_page: int) -> list:
+    # MyBookAPI.get up to the single query change
+    current_user = User.get_by_id(user_id)
+    books_query = Book.query.join(Loan, Loan.book_id == Book.id) \
+                            .filter(Loan.user_id == current_user.id, Loan.returned_at.is_(None)) \
+                            .order_by(Loan.borrowed_at.desc()).paginate(page=1, per_page=per_page, error_out=False)
+    data = []
+    book_serializer = BookSerializer(only=('id', 'title'))
+
+    for book in books_query.items:
+        serialized_data = book_serializer.dump(book)
+        review_book_ids = current_user.review_book_ids()
+        if book.id in review_book_ids:
+            serialized_data['my_review'] = BookReviewSerializer().dump(review_book_ids.get(book.id))
+        else:
+            serialized_data['my_review'] = {}
+        data.append(serialized_data)
+
+    db.session.remove()
+    return data
+
+
+def after(user_id: str, per_page: int) -> list:
+    books_query = db.session.query(Book.id, Book.title, BookReview) \
+                            .join(Loan, Loan.book_id == Book.id) \
+                            .outerjoin(BookReview, (BookReview.book_id == Book.id) & (BookReview.user_id == user_id)) \
+                            .filter(Loan.user_id == user_id, Loan.returned_at.is_(None)) \
+                            .order_by(Loan.borrowed_at.desc()).paginate(page=1, per_page=per_page, error_out=False)
+    data = []
+
+    for book in books_query.items:
+        serialized_data = my_book_serializer.dump(book)
+        serialized_data['my_review'] = review_serializer.dump(book.BookReview) if book.BookReview else {}
+        data.append(serialized_data)
+
+    db.session.remove()
+    return data
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--loans', type=int, default=50)
+    parser.add_argument('--reviews', type=int, default=500)
+    parser.add_argument('--per-page', type=int, default=50)
+    args = parser.parse_args()
+
+    app = bench_app()
+    with app.app_context():
+        user_id = seed(args.loans, args.reviews)
+        assert before(user_id, args.per_page) == after(user_id, args.per_page)
+        print(f'{args.loans} open loans, {args.reviews} reviews by the user, {args.per_page} per page')
+
+        for name, fn in (('before (review per book)', before), ('after (single query)', after)):
+            with count_statements() as statements:
+                fn(user_id, args.per_page)
+            report(name, measure(lambda: fn(user_id, args.per_page)), len(statements))
+
+
+if __name__ == '__main__':
+    main()
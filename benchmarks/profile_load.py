@@ -0,0 +1,80 @@
+# Concurrent borrow/return & read load on the development (engine defaults) & production (pool, WAL) profiles
+from concurrent.futures import ThreadPoolExecutor
+from app import db
+from app.DB.models import User, Book, generate_id
+from .common import bench_app
+import argparse
+import random
+import statistics
+import time
+
+
+def seed(books: int, readers: int) -> tuple:
+    admin_id = db.session.query(User.id).filter_by(username='admin').scalar()
+    book_ids = [generate_id() for _ in range(books)]
+    db.session.execute(Book.__table__.insert(), [dict(id=_id, title=f'book {number:04d}', author='author', count=5,
+                                                      short_description='short', user_id=admin_id)
+                                                 for number, _id in enumerate(book_ids)])
+    for number in range(readers):
+        db.session.add(User(username=f'reader{number}', email=f'reader{number}@example.com', first_name='reader',
+                            last_name='', password='secret', user_type=User.Public))
+    db.session.commit()
+    return book_ids
+
+
+def run(profile: str, threads: int, rounds: int, books: int) -> dict:
+    app = bench_app(profile)
+    with app.app_context():
+        book_ids = seed(books, threads)
+        db.session.remove()
+
+    client = app.test_client()
+    headers = []
+    for number in range(threads):
+        response = client.post('/api/user/login', json={'user': f'reader{number}', 'password': 'secret'})
+        headers.append({'Authorization': f"Bearer {response.get_json()['data']['access_token']}"})
+
+    def reader(header) -> list:
+        reader_client = app.test_client()
+        results = []
+        for _ in range(rounds):
+            book_id = random.choice(book_ids)
+            for url in ('/api/book?page_num=2', f'/api/book/{book_id}', f'/api/book/borrow/{book_id}',
+                        f'/api/book/return/{book_id}'):
+                started = time.perf_counter()
+                try:
+                    status = reader_client.get(url, headers=header).status_code
+                except Exception:
+                    # The development profile propagates errors such as 'database is locked' out of the client
+                    status = 500
+                results.append(((time.perf_counter() - started) * 1000, status))
+        return results
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = [result for thread_results in executor.map(reader, headers) for result in thread_results]
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for latency, _ in results)
+    return dict(requests=len(results), throughput=len(results) / elapsed,
+                median=statistics.median(latencies), p95=latencies[int(len(latencies) * 0.95) - 1],
+                p99=latencies[int(len(latencies) * 0.99) - 1],
+                errors=sum(status >= 500 for _, status in results))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--rounds', type=int, default=25)
+    parser.add_argument('--books', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f'{args.threads} threads x {args.rounds} rounds of list, detail, borrow & return over {args.books} books')
+    for profile in ('development', 'production'):
+        result = run(profile, args.threads, args.rounds, args.books)
+        print(f"{profile:<12} {result['throughput']:7.1f} req/s  median {result['median']:7.2f}ms  "
+              f"p95 {result['p95']:7.2f}ms  p99 {result['p99']:7.2f}ms  5xx {result['errors']}/{result['requests']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+# Production server settings, run with `gunicorn` from the project root (gunicorn.conf.py is picked up by default)
+import multiprocessing
+import os
+import time
+
+# app.wsgi defaults to the production profile, LMS_CONFIG overrides it
+wsgi_app = 'app.wsgi:app'
+bind = os.environ.get('LMS_BIND', '127.0.0.1:8000')
+
+# The app is imported once in the master & the workers share its memory copy-on-write
+preload_app = True
+
+# Threads overlap the SQLite I/O & the bcrypt hashing, which both release the GIL
+cores = multiprocessing.cpu_count()
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', cores * 2 + 1))
+threads = int(os.environ.get('LMS_THREADS', 4))
+
+timeout = int(os.environ.get('LMS_TIMEOUT', 30))
+# In flight requests get this long to finish on SIGTERM, SIGHUP & worker recycling
+graceful_timeout = int(os.environ.get('LMS_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+# Recycling workers bounds the memory a long running worker can grow to
+max_requests = int(os.environ.get('LMS_MAX_REQUESTS', 10000))
+max_requests_jitter = max_requests // 10
+
+accesslog = os.environ.get('LMS_ACCESS_LOG')
+loglevel = os.environ.get('LMS_LOG_LEVEL', 'info')
+
+started_at = time.monotonic()
+
+
+# Resident & proportional set size in MB, PSS splits the pages shared with the master & other workers
+def memory_mb() -> dict:
+    memory = {}
+    try:
+        with open(f'/proc/{os.getpid()}/smaps_rollup') as file:
+            for line in file:
+                name, _, value = line.partition(':')
+                if name in ('Rss', 'Pss'):
+                    memory[name.lower()] = int(value.split()[0]) / 1024
+    except OSError:
+        import resource
+        memory['rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    return memory
+
+
+def describe(memory: dict) -> str:
+    return ', '.join(f'{name} {value:.1f}MB' for name, value in memory.items())
+
+
+def when_ready(server) -> None:
+    server.log.info('App preloaded in %.0fms, %s, %d workers x %d threads on %d cores',
+                    (time.monotonic() - started_at) * 1000, describe(memory_mb()), server.num_workers,
+                    server.cfg.threads, cores)
+
+
+def pre_fork(server, worker) -> None:
+    worker.forked_at = time.monotonic()
+
+
+def post_fork(server, worker) -> None:
+    # Pooled connections opened by the master must not be shared with the workers
+    from app import db
+    from app.DB.engine import dispose_engines
+    from app.wsgi import app
+
+    dispose_engines(db, app)
+
+
+def post_worker_init(worker) -> None:
+    worker.log.info('Worker %s booted in %.0fms, %s', worker.pid, (time.monotonic() - worker.forked_at) * 1000,
+                    describe(memory_mb()))
@@ -0,0 +1,78 @@
+from app import create_app, db
+from app.config import TestingConfig
+from app.DB.engine import dispose_engines
+from app.DB.migrations import upgrade
+from app.utils import seed_admin
+import pytest
+
+
+# SQLite file per test, threads & separate connections see the same data unlike sqlite://
+@pytest.fixture
+def database_url(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'lms.db'}"
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI', url)
+    return url
+
+
+@pytest.fixture
+def app(database_url):
+    app = create_app('testing')
+    with app.app_context():
+        upgrade(log=lambda message: None)
+        seed_admin('admin', 'admin@example.com', 'admin')
+
+    yield app
+
+    with app.app_context():
+        db.session.remove()
+    dispose_engines(db, app)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+# Authorization header of a fresh login
+@pytest.fixture
+def auth_header(client):
+    def login(user: str = 'admin', password: str = 'admin') -> dict:
+        response = client.post('/api/user/login', json={'user': user, 'password': password})
+        assert response.status_code == 200, response.get_json()
+        return {'Authorization': f"Bearer {response.get_json()['data']['access_token']}"}
+
+    return login
+
+
+# Registering a public user through the API, returns the login header of the user
+@pytest.fixture
+def public_user(client, auth_header):
+    def register(username: str = 'reader') -> dict:
+        response = client.post('/api/user/register', headers=auth_header(),
+                               json=dict(username=username, email=f'{username}@example.com', first_name=username,
+                                         last_name='reader', address='address', phone='0123456789',
+                                         password1='secret', password2='secret', user_type='Public'))
+        assert response.status_code in (200, 201), response.get_json()
+        return auth_header(username, 'secret')
+
+    return register
+
+
+# Creating a book through the API, returns its id, titles are stored lower case
+@pytest.fixture
+def create_book(client, auth_header):
+    def create(title: str, count: int = 1, **fields) -> str:
+        headers = auth_header()
+        category = client.post('/api/category', headers=headers, json={'name': 'Fiction'})
+        categories = client.get('/api/category', headers=headers).get_json()['data']
+        assert category.status_code in (200, 201, 409) and categories
+        response = client.post('/api/book', headers=headers,
+                               json=dict(dict(title=title, author='author', short_description='short',
+                                              full_description='full', count=count,
+                                              category_id=[categories[0]['id']]), **fields))
+        assert response.status_code in (200, 201), response.get_json()
+
+        books = client.get('/api/book', headers=headers, query_string={'title': title}).get_json()['data']
+        return next(book['id'] for book in books if book['title'] == title.lower())
+
+    return create
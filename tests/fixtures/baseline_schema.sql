@@ -0,0 +1,109 @@
+-------App created Successfully-------
+-------Tables created Successfully-------
+-------Admin created Successfully-------
+CREATE TABLE user (
+	id VARCHAR(40) NOT NULL, 
+	username VARCHAR(150) NOT NULL, 
+	email VARCHAR(150) NOT NULL, 
+	phone VARCHAR(20), 
+	password_hash VARCHAR(500), 
+	user_type VARCHAR(15), 
+	first_name VARCHAR(150), 
+	last_name VARCHAR(150), 
+	full_name VARCHAR(300), 
+	address VARCHAR(450), 
+	is_active BOOLEAN, 
+	created_at DATETIME, 
+	updated_at DATETIME, 
+	updated_by VARCHAR(250), 
+	book_borrowed TEXT, 
+	activated_user_id VARCHAR(40), 
+	PRIMARY KEY (id, username, email), 
+	UNIQUE (id), 
+	FOREIGN KEY(activated_user_id) REFERENCES user (id)
+);
+CREATE INDEX ix_user_full_name ON user (full_name);
+CREATE INDEX ix_user_user_type ON user (user_type);
+CREATE UNIQUE INDEX ix_user_username ON user (username);
+CREATE UNIQUE INDEX ix_user_email ON user (email);
+CREATE INDEX ix_user_phone ON user (phone);
+CREATE TABLE history (
+	id VARCHAR(40) NOT NULL, 
+	user_id VARCHAR(40) NOT NULL, 
+	book_id VARCHAR(40) NOT NULL, 
+	book_title VARCHAR(650), 
+	user_name VARCHAR(650), 
+	date DATETIME, 
+	type VARCHAR(10), 
+	PRIMARY KEY (id, user_id, book_id), 
+	UNIQUE (id)
+);
+CREATE INDEX ix_history_type ON history (type);
+CREATE INDEX ix_history_user_name ON history (user_name);
+CREATE INDEX ix_history_book_title ON history (book_title);
+CREATE TABLE user_current_jwt_token (
+	user_id VARCHAR(40) NOT NULL, 
+	jti VARCHAR(40), 
+	PRIMARY KEY (user_id), 
+	UNIQUE (user_id)
+);
+CREATE TABLE token_blocklist (
+	id VARCHAR(40) NOT NULL, 
+	jti VARCHAR(40) NOT NULL, 
+	created_at DATETIME NOT NULL, 
+	PRIMARY KEY (id), 
+	UNIQUE (id)
+);
+CREATE INDEX ix_token_blocklist_jti ON token_blocklist (jti);
+CREATE TABLE category (
+	id VARCHAR(40) NOT NULL, 
+	name VARCHAR(50), 
+	created_at DATETIME, 
+	updated_at DATETIME, 
+	updated_by VARCHAR(250), 
+	user_id VARCHAR(40), 
+	PRIMARY KEY (id), 
+	UNIQUE (id), 
+	FOREIGN KEY(user_id) REFERENCES user (id)
+);
+CREATE UNIQUE INDEX ix_category_name ON category (name);
+CREATE TABLE book (
+	id VARCHAR(40) NOT NULL, 
+	title VARCHAR(650), 
+	author VARCHAR(150), 
+	short_description VARCHAR(650), 
+	full_description TEXT, 
+	count INTEGER, 
+	created_at DATETIME, 
+	updated_at DATETIME, 
+	updated_by VARCHAR(250), 
+	overall_rating FLOAT, 
+	total_rating INTEGER, 
+	total_review INTEGER, 
+	user_id VARCHAR(40), 
+	PRIMARY KEY (id), 
+	UNIQUE (id), 
+	FOREIGN KEY(user_id) REFERENCES user (id)
+);
+CREATE INDEX ix_book_author ON book (author);
+CREATE UNIQUE INDEX ix_book_title ON book (title);
+CREATE INDEX ix_book_overall_rating ON book (overall_rating);
+CREATE TABLE category_book (
+	category_id VARCHAR(40), 
+	book_id VARCHAR(40), 
+	FOREIGN KEY(category_id) REFERENCES category (id), 
+	FOREIGN KEY(book_id) REFERENCES book (id)
+);
+CREATE TABLE book_review (
+	id VARCHAR(40) NOT NULL, 
+	rating INTEGER, 
+	review VARCHAR(650), 
+	create_at DATETIME, 
+	book_id VARCHAR(40), 
+	user_id VARCHAR(40), 
+	PRIMARY KEY (id), 
+	UNIQUE (id), 
+	FOREIGN KEY(book_id) REFERENCES book (id), 
+	FOREIGN KEY(user_id) REFERENCES user (id)
+);
+CREATE INDEX ix_book_review_rating ON book_review (rating);
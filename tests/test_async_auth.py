@@ -0,0 +1,54 @@
+from flask_jwt_extended import get_jwt_identity
+from werkzeug.exceptions import Unauthorized
+import app.utils as utils
+import asyncio
+import pytest
+import threading
+
+
+@utils.auth_required
+async def role_view():
+    return get_jwt_identity()['role']
+
+
+# Runs the view in a request context on a fresh event loop, returns (loop thread, result)
+def call_view(app, headers):
+    async def main():
+        with app.test_request_context(headers=headers):
+            return threading.get_ident(), await role_view()
+
+    return asyncio.run(main())
+
+
+@pytest.fixture
+def lookup_threads(app, monkeypatch):
+    threads = []
+
+    def recording(load):
+        def wrapper(value):
+            threads.append(threading.get_ident())
+            return load(value)
+        return wrapper
+
+    monkeypatch.setattr(utils, 'token_in_blocklist', recording(utils.token_in_blocklist))
+    monkeypatch.setattr(utils, 'user_token_version', recording(utils.user_token_version))
+    for name in ('revocation_cache', 'token_versions'):
+        app.extensions[name].entries.clear()
+
+    return threads
+
+
+def test_async_views_authorize_off_the_event_loop(app, auth_header, lookup_threads):
+    loop_thread, role = call_view(app, auth_header())
+
+    assert role == 'Admin'
+    assert len(lookup_threads) == 2
+    assert loop_thread not in lookup_threads
+
+
+def test_async_views_reject_revoked_tokens(app, client, auth_header, lookup_threads):
+    headers = auth_header()
+    assert client.delete('/api/user/logout', headers=headers).status_code == 200
+
+    with pytest.raises(Unauthorized):
+        call_view(app, headers)
@@ -0,0 +1,10 @@
+from app.DB.audit import audit_queries
+
+
+def test_endpoint_queries_read_no_whole_table(app):
+    with app.app_context():
+        results = {name: (plan, full_scans) for name, plan, full_scans, _ in audit_queries()}
+
+    assert {name: full_scans for name, (_, full_scans) in results.items() if full_scans} == {}
+    assert any('book_fts' in line for line in results['book search'][0])
+    assert not any('book_fts' in line for line in results['book list by title & author'][0])
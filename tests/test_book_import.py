@@ -0,0 +1,52 @@
+import io
+import json
+from app.DB.book_import import BookImporter, CSV, read_rows
+from app.DB.models import Book, Category, User, db, generate_id
+
+
+def import_lines(client, headers, lines: list, **args) -> dict:
+    response = client.post('/api/book/import', headers=dict(headers, **{'Content-Type': 'application/x-ndjson'}),
+                           data=''.join(json.dumps(line) + '\n' for line in lines), query_string=args)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()['data']
+
+
+def test_import_rejects_fractional_counts(app, client, auth_header):
+    report = import_lines(client, auth_header(), [dict(title='dune', author='herbert', count=2.5),
+                                                  dict(title='emma', author='austen', count=2.0),
+                                                  dict(title='walden', author='thoreau', count=True),
+                                                  dict(title='ulysses', author='joyce', count='3'),
+                                                  dict(title='hamlet', author='shakespeare', count='1.5'),
+                                                  dict(title='faust', author='goethe', count=[1])])
+
+    assert report['imported'] == 2
+    assert report['errors'] == [dict(line=1, error='count must be a whole number'),
+                                dict(line=3, error='count must be a whole number'),
+                                dict(line=5, error='count must be a whole number'),
+                                dict(line=6, error='count must be a whole number')]
+    with app.app_context():
+        assert dict(db.session.query(Book.title, Book.count)) == {'emma': 2, 'ulysses': 3}
+
+
+# A category created by a concurrent write fails its insert, only the rows using it are rejected
+def test_import_reports_rows_of_a_conflicting_new_category(app):
+    lines = 'title,author,count,categories\n' \
+            'dune,herbert,1,poetry\n' \
+            'emma,austen,1,drama\n' \
+            'walden,thoreau,1,poetry\n'
+
+    with app.app_context():
+        user_id = User.query.filter_by(username='admin').one().id
+        importer = BookImporter(user_id, batch_size=2, create_categories=True)
+        existing_id = generate_id()
+        db.session.execute(Category.__table__.insert(), [dict(id=existing_id, name='poetry', user_id=user_id)])
+        db.session.commit()
+
+        report = importer.run(read_rows(io.StringIO(lines), CSV))
+
+        assert (report['imported'], report['failed'], report['created_categories']) == (2, 1, 1)
+        assert [error['line'] for error in report['errors']] == [2]
+        assert 'UNIQUE' in report['errors'][0]['error']
+        assert {book.title: [category.name for category in book.category] for book in Book.query} == \
+               {'emma': ['drama'], 'walden': ['poetry']}
+        assert Category.query.filter_by(name='poetry').one().id == existing_id
@@ -0,0 +1,53 @@
+import orjson
+import time
+
+
+def test_category_list_answers_conditional_requests(client, auth_header):
+    headers = auth_header()
+    assert client.post('/api/category', headers=headers, json={'name': 'Fiction'}).status_code == 200
+
+    response = client.get('/api/category', headers=headers)
+    assert response.status_code == 200
+    etag, last_modified = response.headers['ETag'], response.headers['Last-Modified']
+    assert [category['name'] for category in response.get_json()['data']] == ['fiction']
+
+    assert client.get('/api/category', headers=dict(headers, **{'If-None-Match': etag})).status_code == 304
+    assert client.get('/api/category',
+                      headers=dict(headers, **{'If-Modified-Since': last_modified})).status_code == 304
+
+
+def test_category_write_changes_the_list_validators(client, auth_header):
+    headers = auth_header()
+    assert client.post('/api/category', headers=headers, json={'name': 'Fiction'}).status_code == 200
+    response = client.get('/api/category', headers=headers)
+    category = response.get_json()['data'][0]
+    etag, last_modified = response.headers['ETag'], response.headers['Last-Modified']
+
+    # Last-Modified has a one second resolution
+    time.sleep(1.1)
+    assert client.put(f"/api/category/{category['id']}", headers=headers, json={'name': 'Poetry'}).status_code == 200
+
+    response = client.get('/api/category', headers=dict(headers, **{'If-None-Match': etag}))
+    assert response.status_code == 200
+    assert [category['name'] for category in response.get_json()['data']] == ['poetry']
+    assert response.headers['ETag'] != etag
+    assert response.headers['Last-Modified'] != last_modified
+    assert client.get('/api/category',
+                      headers=dict(headers, **{'If-Modified-Since': last_modified})).status_code == 200
+
+    etag = response.headers['ETag']
+    assert client.post('/api/category', headers=headers, json={'name': 'Drama'}).status_code == 200
+    response = client.get('/api/category', headers=dict(headers, **{'If-None-Match': etag}))
+    assert response.status_code == 200
+    assert [category['name'] for category in response.get_json()['data']] == ['drama', 'poetry']
+
+
+# The cached list body is encoded like every other resource, not by the json module
+def test_category_list_body_matches_the_other_lists(client, auth_header, create_book):
+    headers = auth_header()
+    create_book('dune')
+    categories = client.get('/api/category', headers=headers)
+    books = client.get('/api/book', headers=headers)
+
+    for response in (categories, books):
+        assert response.data == orjson.dumps(response.get_json(), option=orjson.OPT_APPEND_NEWLINE)
@@ -0,0 +1,38 @@
+import base64
+import json
+import pytest
+
+
+def raw_cursor(values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+@pytest.mark.parametrize('url', ['/api/book', '/api/history'])
+@pytest.mark.parametrize('cursor', ['zzz', raw_cursor([{}, {}]), raw_cursor([[1], 'id']), raw_cursor([None, 'id']),
+                                    raw_cursor([True, 'id']), raw_cursor(['only one']), raw_cursor({'a': 1})])
+def test_malformed_cursor_is_a_bad_request(client, auth_header, url, cursor):
+    response = client.get(url, headers=auth_header(), query_string={'cursor': cursor})
+
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Invalid cursor'
+
+
+def test_history_cursor_needs_an_iso_date(client, auth_header):
+    response = client.get('/api/history', headers=auth_header(), query_string={'cursor': raw_cursor([1, 'id'])})
+
+    assert response.status_code == 400
+
+
+def test_cursor_pages_cover_the_list(client, auth_header, create_book):
+    titles = sorted(f'book {number}' for number in range(5))
+    for title in titles:
+        create_book(title)
+
+    seen, cursor = [], ''
+    while cursor is not None:
+        response = client.get('/api/book', headers=auth_header(), query_string={'cursor': cursor, 'per_page': 2})
+        assert response.status_code == 200
+        seen += [book['title'] for book in response.get_json()['data']]
+        cursor = response.get_json()['next_cursor']
+
+    assert seen == titles
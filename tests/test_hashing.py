@@ -0,0 +1,51 @@
+from app import db, password_hasher
+from app.DB.models import User
+from app.hashing import _HasherState
+import threading
+
+
+def stored_hash(app, username: str) -> str:
+    with app.app_context():
+        password_hash = db.session.query(User.password_hash).filter_by(username=username).scalar()
+        db.session.remove()
+    return password_hash
+
+
+def test_login_rehashes_passwords_made_with_another_cost(app, client):
+    assert stored_hash(app, 'admin').startswith('$2b$04$')
+    app.extensions['password_hasher'] = _HasherState(workers=1, queue_size=1, rounds=5)
+
+    response = client.post('/api/user/login', json={'user': 'admin', 'password': 'admin'})
+    assert response.status_code == 200
+    assert stored_hash(app, 'admin').startswith('$2b$05$')
+
+    assert client.post('/api/user/login', json={'user': 'admin', 'password': 'admin'}).status_code == 200
+    assert client.post('/api/user/login', json={'user': 'admin', 'password': 'wrong'}).status_code != 200
+
+
+def test_saturated_hashing_pool_answers_503(app, client):
+    app.extensions['password_hasher'] = _HasherState(workers=1, queue_size=0, rounds=4)
+    started, release = threading.Event(), threading.Event()
+
+    def busy() -> None:
+        started.set()
+        release.wait(10)
+
+    def hold_the_pool() -> None:
+        with app.app_context():
+            password_hasher.run(busy)
+
+    holder = threading.Thread(target=hold_the_pool)
+    holder.start()
+    try:
+        assert started.wait(10)
+        response = client.post('/api/user/login', json={'user': 'admin', 'password': 'admin'})
+    finally:
+        release.set()
+        holder.join()
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    assert response.get_json()['status'] == 'SERVICE_UNAVAILABLE'
+
+    assert client.post('/api/user/login', json={'user': 'admin', 'password': 'admin'}).status_code == 200
@@ -0,0 +1,74 @@
+import csv
+import datetime
+import gzip
+import io
+import json
+import pytest
+from app.API.views.book_api import HistoryExportAPI
+from app.DB.models import History, db
+
+
+@pytest.fixture
+def history_rows(app, monkeypatch):
+    # Small chunks & fetches so the body is streamed in several pieces
+    monkeypatch.setattr(HistoryExportAPI, 'chunk_size', 64)
+    monkeypatch.setattr(HistoryExportAPI, 'fetch_size', 2)
+
+    days = [datetime.datetime(2022, 3, 20, 9), datetime.datetime(2022, 1, 5, 12), datetime.datetime(2022, 2, 10, 18),
+            datetime.datetime(2022, 2, 28, 23, 30), datetime.datetime(2022, 4, 1)]
+    with app.app_context():
+        rows = [History(user_id=f'user{i}', user_name=f'user {i}', book_id=f'book{i}', book_title=f'title, {i}',
+                        type=History.borrow_book if i % 2 else History.return_book, date=day)
+                for i, day in enumerate(days)]
+        db.session.add_all(rows)
+        db.session.commit()
+
+        return sorted(((row.id, row.date.isoformat(), row.book_title) for row in rows), key=lambda row: row[1])
+
+
+def test_history_export_streams_csv(client, auth_header, history_rows):
+    response = client.get('/api/history/export', headers=auth_header())
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.mimetype == 'text/csv'
+    assert 'filename=history.csv' in response.headers['Content-Disposition']
+
+    chunks = list(response.response)
+    assert len(chunks) > 1
+
+    header, *rows = csv.reader(io.StringIO(b''.join(chunks).decode()))
+    assert header == ['id', 'date', 'type', 'user_id', 'user_name', 'book_id', 'book_title']
+    assert [(row[0], row[1], row[6]) for row in rows] == history_rows
+
+
+def test_history_export_streams_gzip_ndjson(client, auth_header, history_rows):
+    response = client.get('/api/history/export', headers=auth_header(),
+                          query_string={'format': 'ndjson', 'gzip': 'true'})
+    assert response.status_code == 200
+    assert response.mimetype == 'application/gzip'
+    assert 'filename=history.ndjson.gz' in response.headers['Content-Disposition']
+
+    lines = gzip.decompress(response.get_data()).decode().splitlines()
+    rows = [json.loads(line) for line in lines]
+    assert [(row['id'], row['date'], row['book_title']) for row in rows] == history_rows
+    assert {row['type'] for row in rows} == {History.borrow_book, History.return_book}
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'ndjson'])
+def test_history_export_filters_by_date_range(client, auth_header, history_rows, fmt):
+    response = client.get('/api/history/export', headers=auth_header(),
+                          query_string={'format': fmt, 'date': '2022-02-01,2022-03-20'})
+    assert response.status_code == 200
+
+    body = response.get_data(as_text=True)
+    if fmt == 'csv':
+        dates = [row[1] for row in list(csv.reader(io.StringIO(body)))[1:]]
+    else:
+        dates = [json.loads(line)['date'] for line in body.splitlines()]
+    # Both ends of the range are whole days
+    assert dates == ['2022-02-10T18:00:00', '2022-02-28T23:30:00', '2022-03-20T09:00:00']
+
+
+def test_history_export_rejects_unknown_format(client, auth_header):
+    response = client.get('/api/history/export', headers=auth_header(), query_string={'format': 'xml'})
+    assert response.status_code == 400
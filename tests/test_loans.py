@@ -0,0 +1,40 @@
+from concurrent.futures import ThreadPoolExecutor
+from app import db
+from app.DB.models import Book, Loan
+import pytest
+
+copies = 3
+readers = 8
+rounds = 15
+
+
+# Readers racing for the few copies of one book, each borrowing & returning it over & over
+@pytest.mark.parametrize('journal_mode', [None, 'WAL'])
+def test_concurrent_borrow_and_return_keep_copies_consistent(app, client, public_user, create_book, journal_mode):
+    book_id = create_book('dune', count=copies)
+    headers = [public_user(f'reader{number}') for number in range(readers)]
+    if journal_mode:
+        with app.app_context(), db.engine.connect() as connection:
+            connection.exec_driver_sql(f'PRAGMA journal_mode = {journal_mode}')
+
+    def borrow_and_return(header) -> list:
+        reader_client = app.test_client()
+        statuses = []
+        for _ in range(rounds):
+            statuses.append(reader_client.get(f'/api/book/borrow/{book_id}', headers=header).status_code)
+            statuses.append(reader_client.get(f'/api/book/return/{book_id}', headers=header).status_code)
+        return statuses
+
+    with ThreadPoolExecutor(max_workers=readers) as executor:
+        statuses = [status for result in executor.map(borrow_and_return, headers) for status in result]
+
+    assert not [status for status in statuses if status >= 500]
+    assert statuses.count(200) > 0
+
+    with app.app_context():
+        available = db.session.query(Book.count).filter_by(id=book_id).scalar()
+        open_loans = Loan.query.filter_by(book_id=book_id, returned_at=None).count()
+        db.session.remove()
+
+    assert available >= 0
+    assert available + open_loans == copies
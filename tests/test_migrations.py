@@ -0,0 +1,53 @@
+from sqlalchemy import inspect
+from app import create_app, db
+from app.DB import migrations as migrations_module, models
+from app.DB.migrations import migrations, upgrade
+from app.DB.models import User, Loan
+import json
+import datetime
+import os
+import pytest
+import sqlite3
+import uuid
+
+baseline_schema = os.path.join(os.path.dirname(__file__), 'fixtures', 'baseline_schema.sql')
+
+
+# Database created by the first release with create_all, holding a legacy book_borrowed list
+def create_baseline_database(path: str) -> tuple:
+    user_id, book_id = str(uuid.uuid4()), str(uuid.uuid4())
+
+    with sqlite3.connect(path) as connection, open(baseline_schema) as file:
+        connection.executescript(file.read())
+        connection.execute("INSERT INTO user (id, username, email, user_type, is_active, book_borrowed) "
+                           "VALUES (?, 'reader', 'reader@example.com', 'Public', 1, ?)", (user_id, json.dumps([book_id])))
+        connection.execute("INSERT INTO book (id, title, author, count, user_id) VALUES (?, 'Dune', 'Herbert', 1, ?)",
+                           (book_id, user_id))
+        connection.execute("INSERT INTO history (id, user_id, book_id, book_title, user_name, date, type) "
+                           "VALUES (?, ?, ?, 'Dune', 'reader', '2022-03-01 10:00:00.000000', 'Borrow')",
+                           (str(uuid.uuid4()), user_id, book_id))
+
+    return user_id, book_id
+
+
+# Migration 3 reads the legacy text ids before migration 7 converts them to the configured storage
+@pytest.mark.parametrize('id_storage', ['string', 'binary'])
+def test_upgrade_from_baseline_schema(database_url, monkeypatch, id_storage):
+    for module in (models, migrations_module):
+        monkeypatch.setattr(module, 'ID_STORAGE', id_storage)
+    user_id, book_id = create_baseline_database(database_url[len('sqlite:///'):])
+    app = create_app('testing')
+
+    with app.app_context():
+        assert upgrade(log=lambda message: None) == [step.version for step in migrations]
+
+        assert 'token_version' in {column['name'] for column in inspect(db.engine).get_columns('user')}
+        loan = Loan.get_active(user_id, book_id)
+        assert loan is not None
+        assert loan.borrowed_at == datetime.datetime(2022, 3, 1, 10)
+        assert db.session.query(User.borrowed_json).filter_by(id=user_id).scalar() == '[]'
+
+        assert upgrade(log=lambda message: None) == []
+        stored_id = db.session.execute(db.text("SELECT id FROM user WHERE username = 'reader'")).scalar()
+        assert isinstance(stored_id, bytes if id_storage == 'binary' else str)
+        db.session.remove()
@@ -0,0 +1,66 @@
+from contextlib import contextmanager
+from sqlalchemy import event
+from app import db
+import pytest
+
+
+@pytest.fixture
+def count_queries(app):
+    # Cached responses would hide the queries of the view
+    app.extensions['response_cache'].ttl = 0
+
+    @contextmanager
+    def counting():
+        statements = []
+
+        def record(connection, cursor, statement, parameters, context, executemany) -> None:
+            statements.append(statement)
+
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', record)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, 'before_cursor_execute', record)
+
+    return counting
+
+
+# Statements of an authorized GET, the auth lookups are cached by a first request
+def get_statements(client, count_queries, url: str, headers: dict) -> list:
+    assert client.get(url, headers=headers).status_code == 200
+    with count_queries() as statements:
+        response = client.get(url, headers=headers)
+    assert response.status_code == 200, response.get_json()
+
+    return statements
+
+
+def borrow_and_review(client, headers: dict, book_id: str) -> None:
+    assert client.get(f'/api/book/borrow/{book_id}', headers=headers).status_code == 200
+    assert client.post(f'/api/book/review/{book_id}', headers=headers,
+                       json={'rating': 4, 'review': 'good'}).status_code in (200, 201)
+
+
+# Book, its adder (joinedload), reviews page, can_review, own review & categories
+def test_book_detail_query_count(client, public_user, create_book, count_queries):
+    book_id = create_book('dune', count=10)
+    for number in range(5):
+        borrow_and_review(client, public_user(f'reader{number}'), book_id)
+
+    headers = public_user('counted')
+    borrow_and_review(client, headers, book_id)
+
+    statements = get_statements(client, count_queries, f'/api/book/{book_id}', headers)
+    assert len(statements) <= 5, statements
+
+
+# Loans with the user's reviews in one query, plus the pagination count
+def test_my_books_query_count(client, public_user, create_book, count_queries):
+    headers = public_user()
+    for number in range(5):
+        borrow_and_review(client, headers, create_book(f'book {number}'))
+
+    statements = get_statements(client, count_queries, '/api/my_books', headers)
+    assert len(statements) <= 2, statements
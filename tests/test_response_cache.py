@@ -0,0 +1,59 @@
+from app import response_cache
+from app.DB.models import User
+
+
+def book_list(client, headers) -> dict:
+    response = client.get('/api/book', headers=headers)
+    assert response.status_code == 200
+    return {book['title']: book['count'] for book in response.get_json()['data']}
+
+
+def book_detail(client, headers, book_id: str) -> dict:
+    response = client.get(f'/api/book/{book_id}', headers=headers)
+    assert response.status_code == 200
+    return response.get_json()['data']
+
+
+def test_book_reads_are_fresh_after_each_write(app, client, auth_header, public_user, create_book):
+    admin, reader = auth_header(), public_user()
+    book_id = create_book('dune', count=1)
+    assert book_list(client, reader) == {'dune': 1}
+    assert book_detail(client, reader, book_id)['count'] == 1
+
+    # The second reads are served from the cache, every read below must still see the write before it
+    assert book_list(client, reader) == {'dune': 1}
+    assert book_detail(client, reader, book_id)['count'] == 1
+    with app.app_context():
+        assert response_cache.stats()['hits'] == 2
+
+    create_book('emma', count=2)
+    assert book_list(client, reader) == {'dune': 1, 'emma': 2}
+
+    assert client.put(f'/api/book/{book_id}', headers=admin, json={'count': 3}).status_code == 200
+    assert book_list(client, reader)['dune'] == 3
+    assert book_detail(client, reader, book_id)['count'] == 3
+
+    assert client.get(f'/api/book/borrow/{book_id}', headers=reader).status_code == 200
+    assert book_list(client, reader)['dune'] == 2
+    assert book_detail(client, reader, book_id)['count'] == 2
+
+    assert client.get(f'/api/book/return/{book_id}', headers=reader).status_code == 200
+    assert book_list(client, reader)['dune'] == 3
+    assert book_detail(client, reader, book_id)['count'] == 3
+
+
+def test_cached_book_lists_are_kept_per_role(app, client, auth_header, public_user, create_book):
+    admin, reader = auth_header(), public_user()
+    book_id = create_book('dune', count=1)
+    assert book_list(client, admin) == book_list(client, reader) == {'dune': 1}
+
+    # Public users only see books with copies left, staff see every book
+    assert client.get(f'/api/book/borrow/{book_id}', headers=reader).status_code == 200
+    assert book_list(client, reader) == {}
+    assert book_list(client, admin) == {'dune': 0}
+    assert book_list(client, reader) == {}
+
+    with app.test_request_context('/api/book'):
+        keys = {response_cache.make_key({}, {'role': role, 'id': 'user'}, False)
+                for role in (User.Public, User.Librarian, User.Admin)}
+    assert len(keys) == 3
@@ -0,0 +1,73 @@
+import pytest
+from flask import g
+from app.config import TestingConfig
+from app.DB.models import Book, Category, db
+from app.DB.routing import REPLICA, sync_sqlite_replica
+
+
+# Second SQLite file as the replica, autouse so it is configured before the app is created
+@pytest.fixture(autouse=True)
+def replica_url(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'replica.db'}"
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_BINDS', {REPLICA: url})
+    return url
+
+
+def titles(client, headers) -> list:
+    response = client.get('/api/book', headers=headers)
+    assert response.status_code == 200
+    return [book['title'] for book in response.get_json()['data']]
+
+
+def sync(app) -> None:
+    with app.app_context():
+        sync_sqlite_replica(db)
+
+
+def post_book(client, headers, title: str, count: int = 1) -> None:
+    response = client.post('/api/book', headers=headers,
+                           json=dict(title=title, author='author', short_description='short', full_description='full',
+                                     count=count, category_id=[]))
+    assert response.status_code in (200, 201), response.get_json()
+
+
+def book_counts(app) -> tuple:
+    with app.app_context():
+        query = 'SELECT count FROM book WHERE title = :title'
+        return (db.session.execute(query, {'title': 'dune'}).scalar(),
+                db.get_engine(bind=REPLICA).execute(query, {'title': 'dune'}).scalar())
+
+
+def test_reads_come_from_the_replica_and_writes_go_to_the_primary(app, client, auth_header):
+    app.extensions['response_cache'].ttl = 0
+    headers = auth_header()
+    post_book(client, headers, 'dune', count=2)
+    sync(app)
+
+    # Written to the primary after the sync, the replica does not have it yet
+    post_book(client, headers, 'emma')
+    assert titles(client, headers) == ['dune']
+
+    with app.app_context():
+        book_id = Book.query.filter_by(title='dune').one().id
+    assert client.get(f'/api/book/borrow/{book_id}', headers=headers).status_code == 200
+    assert book_counts(app) == (1, 2)
+
+    sync(app)
+    assert titles(client, headers) == ['dune', 'emma']
+    assert book_counts(app) == (1, 1)
+
+
+def test_session_falls_back_to_the_primary(app):
+    with app.test_request_context():
+        primary, replica = db.get_engine(), db.get_engine(bind=REPLICA)
+        select = Category.query.statement
+        assert db.session().get_bind(clause=select) is primary
+
+        g.use_replica = True
+        assert db.session().get_bind(clause=select) is replica
+        assert db.session().get_bind(mapper=Category.__mapper__, clause=Category.__table__.insert()) is primary
+
+        # Once the session has written, its reads see that write on the primary
+        assert db.session().get_bind(clause=select) is primary
+        db.session.remove()
@@ -0,0 +1,89 @@
+from sqlalchemy import text
+from app import db
+from app.DB.models import Book
+from app.DB.search import book_search, SQLiteFTS5Backend, LikeSearchBackend
+import pytest
+import uuid
+
+
+def search(client, headers, q: str) -> list:
+    response = client.get('/api/book', headers=headers, query_string={'q': q})
+    assert response.status_code == 200
+    return sorted(book['title'] for book in response.get_json()['data'])
+
+
+# VACUUM & table rebuilds may renumber the rowids of book, which has no INTEGER PRIMARY KEY
+def test_search_follows_book_ids_across_renumbered_rowids(app, client, auth_header, create_book):
+    headers = auth_header()
+    ids = {title: create_book(title) for title in ('dune', 'emma', 'ulysses', 'walden')}
+    assert client.delete(f"/api/book/{ids['emma']}", headers=headers).status_code == 200
+
+    with app.app_context(), db.engine.begin() as connection:
+        connection.execute(text("UPDATE book SET rowid = 1000 - rowid"))
+
+    assert search(client, headers, 'ulysses') == ['ulysses']
+    assert search(client, headers, 'walden') == ['walden']
+    assert search(client, headers, 'emma') == []
+
+    assert client.put(f"/api/book/{ids['walden']}", headers=headers, json={'title': 'walden pond'}).status_code == 200
+    assert search(client, headers, 'pond') == ['walden pond']
+    assert search(client, headers, 'ulysses') == ['ulysses']
+
+
+def test_index_keyed_on_rowids_is_rebuilt(app, client, auth_header, create_book):
+    create_book('dune')
+
+    with app.app_context():
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql('DROP TABLE book_fts')
+            connection.exec_driver_sql('CREATE VIRTUAL TABLE book_fts USING fts5(title, author, short_description, '
+                                       'full_description)')
+        assert book_search.create_index()
+        assert not book_search.create_index()
+
+    assert search(client, auth_header(), 'dune') == ['dune']
+
+
+# Rows of a batch that were not written, e.g. on the row by row retry of an import, must not be indexed
+def test_index_books_indexes_the_given_ids_only(app, client, auth_header):
+    ids = [str(uuid.uuid4()) for _ in range(3)]
+
+    with app.app_context():
+        db.session.execute(Book.__table__.insert(), [dict(id=_id, title=f'atlas {number}', author='author', count=1)
+                                                     for number, _id in enumerate(ids)])
+        book_search.backend.index_books(db.session.connection(), [ids[0], ids[2]])
+        db.session.commit()
+
+    assert search(client, auth_header(), 'atlas') == ['atlas 0', 'atlas 2']
+
+
+def test_imported_books_are_searchable(client, auth_header):
+    headers = auth_header()
+    lines = 'title,author,short_description,full_description,count,categories\n' + \
+            ''.join(f'voyage {number},verne,short,full,1,\n' for number in range(5))
+    response = client.post('/api/book/import', headers=dict(headers, **{'Content-Type': 'text/csv'}), data=lines,
+                           query_string={'batch_size': 2})
+    assert response.status_code == 200, response.get_json()
+
+    assert search(client, headers, 'voyage') == [f'voyage {number}' for number in range(5)]
+
+
+# title & author keep substring semantics whatever the backend, q is the full-text search
+@pytest.mark.parametrize('backend', [SQLiteFTS5Backend, LikeSearchBackend])
+def test_title_and_author_match_substrings_on_every_backend(app, client, auth_header, create_book, backend):
+    headers = auth_header()
+    create_book('harry potter', author='rowling')
+    create_book('dune', author='herbert')
+    app.extensions['book_search'] = backend()
+
+    def titles(**args) -> list:
+        response = client.get('/api/book', headers=headers, query_string=args)
+        assert response.status_code == 200
+        return sorted(book['title'] for book in response.get_json()['data'])
+
+    assert titles(title='arry') == ['harry potter']
+    assert titles(title='ry pot') == ['harry potter']
+    assert titles(author='owl') == ['harry potter']
+    assert titles(title='arry', author='herb') == []
+    assert titles(q='harr') == ['harry potter']
+    assert titles(q='pot', title='harry') == ['harry potter']
@@ -0,0 +1,51 @@
+import pytest
+from app.DB.models import User
+
+
+def user_id(app, username: str) -> str:
+    with app.app_context():
+        return User.query.filter_by(username=username).one().id
+
+
+def test_token_is_rejected_after_role_change(app, client, auth_header, public_user):
+    reader = public_user()
+    assert client.get('/api/my_books', headers=reader).status_code == 200
+
+    response = client.put(f"/api/user/{user_id(app, 'reader')}", headers=auth_header(),
+                          json={'user_type': User.Librarian})
+    assert response.status_code == 200, response.get_json()
+
+    assert client.get('/api/my_books', headers=reader).status_code == 401
+    # A new login carries the new role
+    assert client.get('/api/user', headers=auth_header('reader', 'secret')).status_code == 200
+
+
+@pytest.mark.parametrize('via', ['activation', 'update'])
+def test_token_is_rejected_after_deactivation(app, client, auth_header, public_user, via):
+    reader = public_user()
+    assert client.get('/api/my_books', headers=reader).status_code == 200
+
+    path = {'activation': '/api/user/activation/{}', 'update': '/api/user/{}'}[via]
+    response = client.put(path.format(user_id(app, 'reader')), headers=auth_header(),
+                          json={'is_active': False, 'user_type': User.Public})
+    assert response.status_code == 200, response.get_json()
+
+    assert client.get('/api/my_books', headers=reader).status_code == 401
+
+
+def test_token_is_rejected_after_delete(app, client, auth_header, public_user):
+    reader = public_user()
+    assert client.get('/api/my_books', headers=reader).status_code == 200
+
+    response = client.delete(f"/api/user/{user_id(app, 'reader')}", headers=auth_header())
+    assert response.status_code == 200, response.get_json()
+
+    assert client.get('/api/my_books', headers=reader).status_code == 401
+
+
+def test_token_survives_unrelated_user_update(app, client, auth_header, public_user):
+    reader = public_user()
+    response = client.put(f"/api/user/{user_id(app, 'reader')}", headers=reader, json={'address': 'elsewhere'})
+    assert response.status_code == 200, response.get_json()
+
+    assert client.get('/api/my_books', headers=reader).status_code == 200
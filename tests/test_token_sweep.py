@@ -0,0 +1,43 @@
+import datetime
+from app.DB.models import TokenBlocklist, UserCurrentJWTToken, db
+from app.utils import sweep_expired_tokens
+
+
+def seed_tokens(now: datetime.datetime, lifetime: datetime.timedelta) -> None:
+    db.session.add_all([
+        TokenBlocklist(jti='blocked-expired', expires_at=now - datetime.timedelta(minutes=1)),
+        TokenBlocklist(jti='blocked-live', expires_at=now + datetime.timedelta(hours=1)),
+        # Rows from before expires_at was stored, judged by their creation time
+        TokenBlocklist(jti='legacy-expired', created_at=now - lifetime - datetime.timedelta(minutes=1)),
+        TokenBlocklist(jti='legacy-live', created_at=now - datetime.timedelta(minutes=1)),
+        UserCurrentJWTToken(user_id='user-expired-1', jti='current-expired-1',
+                            expires_at=now - datetime.timedelta(days=2)),
+        UserCurrentJWTToken(user_id='user-expired-2', jti='current-expired-2',
+                            expires_at=now - datetime.timedelta(seconds=5)),
+        UserCurrentJWTToken(user_id='user-live', jti='current-live', expires_at=now + datetime.timedelta(minutes=5)),
+    ])
+    db.session.commit()
+
+
+def test_sweep_deletes_only_expired_tokens(app):
+    with app.app_context():
+        seed_tokens(datetime.datetime.utcnow(), app.config['JWT_ACCESS_TOKEN_EXPIRES'])
+
+        # A batch of one makes every table take several batches
+        result = sweep_expired_tokens(batch_size=1)
+
+        assert result['rows'] == 4
+        assert result['bytes'] is not None and result['bytes'] >= 0
+        assert sorted(token.jti for token in TokenBlocklist.query) == ['blocked-live', 'legacy-live']
+        assert [token.jti for token in UserCurrentJWTToken.query] == ['current-live']
+
+        assert sweep_expired_tokens() == dict(rows=0, bytes=0)
+
+
+def test_sweep_tokens_command_reports_deleted_rows(app):
+    with app.app_context():
+        seed_tokens(datetime.datetime.utcnow(), app.config['JWT_ACCESS_TOKEN_EXPIRES'])
+
+    result = app.test_cli_runner().invoke(args=['lms', 'sweep-tokens', '--batch-size', '2'])
+    assert result.exit_code == 0, result.output
+    assert result.output.startswith('Deleted 4 expired token rows, reclaimed ')